@@ -0,0 +1,542 @@
+import discord
+from discord.ext import commands
+import os
+import json
+import hashlib
+import base64
+import asyncio
+import shlex
+import logging
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from llm import allm, astream_llm, astream_chat_response, REGULAR_MODELS, STRUCTURED_MODELS, DEFAULT_STRUCTURED_MODEL
+from llm_cache import response_cache
+from router import router
+from stream_render import render_stream
+from image_gen import gemini_image, image_part, GEMINI_IMAGE_MODEL
+from segmentation import nukki_service, NUKKI_MODEL
+from result_cache import result_cache, content_key, attachment_key
+from preprocess import preprocess, MAX_SIDE
+import comfyui
+from enhance import enhance_prompt
+from batcher import GenBatcher
+from http_client import get_session, close_session, download, iter_json_strings, DownloadTooLarge, MODAL_TIMEOUT
+from prefs import prefs
+import workers
+from images import image_file
+import metrics
+import providers
+from message_cache import message_cache, build_chat_messages
+from jobs import scheduler, JobRejected, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+import aiohttp
+
+load_dotenv(os.path.expanduser('~/.env'))
+load_dotenv()
+
+logger = logging.getLogger('discord')
+
+# MODAL_API_URL = "https://wakgoodai2--qwen-wan-comfyui-api-dev.modal.run/"
+MODAL_API_URL = "https://wakgoodai2--qwen-wan-comfyui-api.modal.run/"
+
+async def generate_images(prompt: str, lora_name: str, batch_size: int = 4):
+    """Yield decoded images from the Modal endpoint as each one finishes arriving in the response body."""
+    async with get_session().post(MODAL_API_URL, json={
+        "prompt": f"{lora_name}, {prompt}",
+        "lora_name": lora_name,
+        "batch_size": batch_size
+    }, timeout=aiohttp.ClientTimeout(total=MODAL_TIMEOUT)) as resp:
+        resp.raise_for_status()
+        async for encoded in iter_json_strings(resp, "images"):
+            # Inline: pickling the payload to a worker costs more than decoding it
+            yield base64.b64decode(encoded)
+
+lora_batcher = GenBatcher(generate_images)
+
+intents = discord.Intents.default()
+intents.message_content = True
+
+# Set by scripts/launch_shards.py for shard-per-process deployments; AUTO_SHARD=1 lets discord.py pick
+SHARD_IDS = [int(i) for i in os.getenv('SHARD_IDS', '').split(',') if i]
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0')) or None
+SYNC_COMMANDS = os.getenv('SYNC_COMMANDS', '1' if not SHARD_IDS or 0 in SHARD_IDS else '0') == '1'
+# Hash of the last command tree pushed to Discord; sync is skipped while it still matches
+COMMAND_HASH_FILE = os.path.expanduser(os.getenv('COMMAND_HASH_FILE', os.path.join(os.path.dirname(__file__), '.command_tree_hash')))
+
+if SHARD_IDS or os.getenv('AUTO_SHARD') == '1':
+    bot = commands.AutoShardedBot(command_prefix='!', intents=intents, shard_ids=SHARD_IDS or None, shard_count=SHARD_COUNT)
+else:
+    bot = commands.Bot(command_prefix='!', intents=intents)
+
+def command_tree_hash():
+    # Keyed by application too, so starting the checkout with another bot token still syncs that bot
+    payload = [bot.application_id, [command.to_dict(bot.tree) for command in bot.tree.get_commands()]]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+async def sync_commands():
+    """Push the command tree only when it differs from what was last synced."""
+    digest = command_tree_hash()
+    try:
+        with open(COMMAND_HASH_FILE) as f:
+            if f.read().strip() == digest:
+                return False
+    except FileNotFoundError:
+        pass
+    await bot.tree.sync()
+    with open(COMMAND_HASH_FILE, 'w') as f:
+        f.write(digest)
+    print(f"Synced {len(bot.tree.get_commands())} commands", flush=True)
+    return True
+
+async def warm_up():
+    # Off the startup path: the gateway connects while models and SDK clients load
+    try:
+        await asyncio.gather(nukki_service.start(), providers.warm('async_anthropic', 'async_openai', 'gemini'))
+    except Exception as e:
+        print(f"Warm-up failed: {e}", flush=True)
+
+@bot.event
+async def setup_hook():
+    await metrics.start()
+    # Runs once per process (not on every reconnect) and only in one process when sharded
+    if SYNC_COMMANDS:
+        try:
+            await sync_commands()
+        except Exception as e:
+            # Keep serving with the previously registered commands rather than failing startup
+            print(f"Command sync failed: {e}", flush=True)
+    asyncio.create_task(warm_up())
+
+@bot.event
+async def on_ready():
+    print("Bot ready!", flush=True)
+
+def observe_command(name, created_at, status):
+    # Measured from the Discord-side creation time, so it is what the user actually waited
+    metrics.observe("command_seconds", (discord.utils.utcnow() - created_at).total_seconds(), command=name, status=status)
+
+async def clear_queue_status(interaction: discord.Interaction, content: str = None):
+    """Remove (or overwrite) the queue status that queue_slot() left on the original response.
+
+    Once edited, the original response stops being the "thinking" placeholder that the first
+    followup would replace, so results arrive as new messages and the status would linger.
+    """
+    if not interaction.extras.pop('queue_status', False):
+        return False
+    try:
+        if content is None:
+            await interaction.delete_original_response()
+        else:
+            await interaction.edit_original_response(content=content)
+    except discord.HTTPException as e:
+        print(f"Could not clear queue status: {e}", flush=True)
+    return True
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    observe_command(command.name, interaction.created_at, "ok")
+    await clear_queue_status(interaction)
+
+@bot.event
+async def on_command_completion(ctx):
+    observe_command(f"!{ctx.command.name}", ctx.message.created_at, "ok")
+
+@bot.tree.error
+async def on_app_command_error(interaction: discord.Interaction, error):
+    if interaction.command is not None:
+        observe_command(interaction.command.name, interaction.created_at, "error")
+    original = getattr(error, 'original', error)
+    if isinstance(original, JobRejected):
+        await interaction.followup.send(f"❌ {original}")
+        return
+    if not await clear_queue_status(interaction, "❌ Generation failed"):
+        # Otherwise the deferred response would stay on "thinking" forever
+        try:
+            if interaction.response.is_done():
+                await interaction.followup.send(f"❌ {original}")
+            else:
+                await interaction.response.send_message(f"❌ {original}")
+        except discord.HTTPException as e:
+            print(f"Could not report command error: {e}", flush=True)
+    await discord.app_commands.CommandTree.on_error(bot.tree, interaction, error)
+
+@bot.event
+async def on_command_error(ctx, error):
+    if ctx.command is not None:
+        observe_command(f"!{ctx.command.name}", ctx.message.created_at, "error")
+    original = getattr(error, 'original', error)
+    if isinstance(original, JobRejected):
+        await ctx.reply(f"❌ {original}")
+        return
+    await type(bot).on_command_error(bot, ctx, error)
+
+@asynccontextmanager
+async def queue_slot(interaction: discord.Interaction, backend: str, priority: int = PRIORITY_NORMAL, report_position: bool = True):
+    """Hold a job scheduler slot for the block, showing queue position on the deferred response."""
+    reported = False
+
+    async def on_position(position, eta):
+        nonlocal reported
+        reported = True
+        interaction.extras['queue_status'] = True
+        await interaction.edit_original_response(content=f"⏳ Queue position {position}, ETA ~{eta:.0f}s")
+
+    async with scheduler.slot(backend, user_id=interaction.user.id, guild_id=interaction.guild_id,
+                              priority=priority, on_position=on_position if report_position else None):
+        if reported:
+            await interaction.edit_original_response(content="⚙️ Generating...")
+        yield
+
+async def queued(interaction: discord.Interaction, backend: str, fn, priority: int = PRIORITY_NORMAL, report_position: bool = True):
+    """Run fn() through the job scheduler, showing queue position on the deferred response."""
+    async with queue_slot(interaction, backend, priority, report_position):
+        return await fn()
+
+async def queued_ctx(ctx, backend: str, fn, priority: int = PRIORITY_NORMAL):
+    """Prefix-command version of queued(); queue position goes into a temporary reply."""
+    status = None
+
+    async def on_position(position, eta):
+        nonlocal status
+        content = f"⏳ Queue position {position}, ETA ~{eta:.0f}s"
+        if status is None:
+            status = await ctx.reply(content)
+        else:
+            await status.edit(content=content)
+
+    try:
+        return await scheduler.run(backend, fn, user_id=ctx.author.id, guild_id=ctx.guild.id if ctx.guild else None,
+                                   priority=priority, on_position=on_position)
+    finally:
+        if status is not None:
+            await status.delete()
+
+def followup_sender(interaction: discord.Interaction):
+    # wait=True returns the WebhookMessage so render_stream can keep editing it
+    return lambda content: interaction.followup.send(content, wait=True)
+
+MAX_FILES_PER_MESSAGE = 10
+
+async def send_images(interaction: discord.Interaction, images, content: str, name: str):
+    """Post images from an async iterator as each one arrives.
+
+    The first image creates the reply and later ones are attached to it, starting a new
+    message every 10 files, so only one image is held at a time. Returns the number sent;
+    raises if the backend produced nothing, so the interaction never stays on "thinking".
+    """
+    message = None
+    count = 0
+    async for image in images:
+        file = await image_file(image, f'{name}_{count+1:03d}')
+        if count % MAX_FILES_PER_MESSAGE == 0:
+            message = await interaction.followup.send(content if message is None else None, file=file, wait=True)
+        else:
+            message = await message.add_files(file)
+        count += 1
+    if not count:
+        raise RuntimeError(f"{name}: backend produced no images")
+    return count
+
+@bot.command(name='llm')
+async def llm_prefix_cmd(ctx, *, prompt: str):
+    async with ctx.typing():
+        model = await prefs.get(ctx.author.id, 'llm')
+
+        # Replay the reply chain as real turns instead of one flattened context string
+        chain = await message_cache.reply_chain(ctx.message)
+        chat_messages = build_chat_messages(chain, prompt, bot.user, prefix=ctx.prefix)
+
+        await render_stream(astream_chat_response(chat_messages, model=model), ctx.reply, prefix=f"> {prompt}\n\n")
+
+async def source_attachment(ctx):
+    """The image attachment a prefix command works on: the replied-to message's, else the command's own."""
+    if ctx.message.reference:
+        replied_msg = await message_cache.resolve(ctx.channel, ctx.message.reference)
+        return replied_msg.attachments[0] if replied_msg.attachments else None
+    return ctx.message.attachments[0] if ctx.message.attachments else None
+
+async def cached_image_op(ctx, op, params, compute):
+    """Run compute(image_data) on the source attachment through the result cache.
+
+    A repeat on the same attachment is answered without downloading it; the same bytes under
+    another attachment skip the model call. Returns None after replying if there is no usable image.
+    """
+    attachment = await source_attachment(ctx)
+    if attachment is None:
+        await ctx.reply("Reply to a message with an image or attach one")
+        return None
+
+    alias = attachment_key(op, attachment, *params)
+    # A miss here is counted once, by the content-key lookup below
+    output_data = await result_cache.get(alias, count_miss=False)
+    if output_data is not None:
+        return output_data
+
+    try:
+        image_data = await download(attachment.url)
+    except DownloadTooLarge:
+        await ctx.reply("Image is too large")
+        return None
+
+    return await result_cache.get_or_compute(content_key(op, image_data, *params), lambda: compute(image_data), aliases=[alias])
+
+@bot.command(name='i2i')
+async def i2i_cmd(ctx, *, prompt: str):
+    async with ctx.typing():
+        async def compute(image_data):
+            # First frame, capped to what Gemini needs, encoded once in the worker pool
+            input_data, mime_type = await preprocess(image_data, 'gemini')
+            return await queued_ctx(ctx, 'gemini', lambda: gemini_image([prompt, image_part(input_data, mime_type)]))
+
+        output_data = await cached_image_op(ctx, 'i2i', (GEMINI_IMAGE_MODEL, MAX_SIDE['gemini'], prompt), compute)
+
+        if output_data is not None:
+            await ctx.reply(f"> {prompt}", file=await image_file(output_data, 'i2i'))
+
+@bot.command(name='nukki')
+async def nukki_cmd(ctx):
+    async with ctx.typing():
+        output_data = await cached_image_op(ctx, 'nukki', (NUKKI_MODEL, MAX_SIDE['nukki']),
+                                            lambda image_data: queued_ctx(ctx, 'nukki', lambda: nukki_service.remove(image_data), priority=PRIORITY_HIGH))
+
+        if output_data is not None:
+            await ctx.reply(file=await image_file(output_data, 'nukki'))
+
+@bot.command(name='enhance')
+async def enhance_cmd(ctx, *, prompt: str):
+    async with ctx.typing():
+        result = await enhance_prompt(prompt)
+
+        if result["ok"]:
+            await ctx.reply(f"> {prompt}\n\n**Enhanced:**\n{result['enhanced']}")
+        else:
+            await ctx.reply("Enhancement failed")
+
+@bot.tree.command(name="llm", description="Ask the LLM")
+async def llm_cmd(interaction: discord.Interaction, prompt: str):
+    await interaction.response.defer()
+    model = await prefs.get(interaction.user.id, 'llm')
+    await render_stream(astream_llm(prompt, model=model), followup_sender(interaction), prefix=f"> {prompt}\n\n")
+
+@bot.tree.command(name="json-gen", description="Generate properties as strings")
+async def properties_gen_cmd(interaction: discord.Interaction, prompt: str, properties: str):
+    await interaction.response.defer()
+    model = await prefs.get(interaction.user.id, 'llm', 'claude-sonnet-4-5')
+    prop_names = [p.strip() for p in properties.split(',')]
+    full_prompt = f"{prompt}\n\n다음 속성들을 포함해서 생성해줘:\n" + "\n".join(f"**{name}**:" for name in prop_names)
+    await render_stream(astream_llm(full_prompt, model=model), followup_sender(interaction), prefix=f"> {prompt}\n\n")
+
+@bot.tree.command(name="character-text-gen", description="Generate a character")
+async def character_text_gen_cmd(interaction: discord.Interaction, prompt: str):
+    await interaction.response.defer()
+    model = await prefs.get(interaction.user.id, 'llm', 'claude-sonnet-4-5')
+    prop_names = ["이름", "나이", "배경", "출신", "직업", "꿈", "무기", "스킬1", "스킬2", "스킬3"]
+    full_prompt = f"{prompt}\n\n다음 속성들을 포함해서 캐릭터를 생성해줘:\n" + "\n".join(f"**{name}**:" for name in prop_names)
+    await render_stream(astream_llm(full_prompt, model=model, cache=True), followup_sender(interaction), prefix=f"> {prompt}\n\n")
+
+CHARACTER_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sheet": {"type": "string", "description": "The character sheet, written in the user's language"},
+        "portrait": {"type": "string", "description": "Detailed English visual portrait description for image generation"}
+    },
+    "required": ["sheet", "portrait"],
+    "additionalProperties": False
+}
+CHARACTER_SYSTEM = "Write the requested character sheet in `sheet`. In `portrait`, describe the same character as a detailed visual portrait for image generation. Focus on physical appearance, clothing, pose, and mood."
+
+@bot.tree.command(name="character-gen", description="Generate a character and its image")
+async def character_and_image_gen_cmd(interaction: discord.Interaction, prompt: str):
+    await interaction.response.defer()
+    model = await prefs.get(interaction.user.id, 'structured')
+    # Older preferences may name a model that can't do the schema call
+    if model not in STRUCTURED_MODELS:
+        model = DEFAULT_STRUCTURED_MODEL
+    prop_names = ["이름", "나이", "배경", "출신", "직업", "꿈", "무기", "스킬1", "스킬2", "스킬3"]
+    full_prompt = f"{prompt}\n\n다음 속성들을 포함해서 캐릭터를 생성해줘:\n" + "\n".join(f"**{name}**:" for name in prop_names)
+
+    # One structured call returns both the sheet and the portrait description
+    character = await allm(full_prompt, system=CHARACTER_SYSTEM, schema=CHARACTER_SCHEMA, model=model)
+
+    # Start rendering right away so it overlaps with posting the sheet; the first followup
+    # replaces the deferred response, so queue position is not written over it
+    image_task = asyncio.create_task(queued(interaction, 'gemini', lambda: gemini_image([character["portrait"]]), report_position=False))
+
+    char_text = f"> {prompt}\n\n{character['sheet']}"
+    for i in range(0, len(char_text), 2000):
+        await interaction.followup.send(char_text[i:i+2000])
+
+    # Show typing while the image finishes
+    async with interaction.channel.typing():
+        output_data = await image_task
+
+        # Send image
+        if output_data is not None:
+            await interaction.followup.send(file=await image_file(output_data, 'character'))
+
+async def enhance_for_image(prompt: str):
+    """Enhanced prompt for a ComfyUI render, or the original one if enhancement failed."""
+    with metrics.timer("image_stage_seconds", stage="enhance"):
+        return (await enhance_prompt(prompt))["enhanced"]
+
+@bot.tree.command(name="qwen-wan", description="LoRA 이미지 생성")
+@discord.app_commands.choices(aspect=[
+    discord.app_commands.Choice(name="Portrait", value="portrait"),
+    discord.app_commands.Choice(name="Landscape", value="landscape"),
+    discord.app_commands.Choice(name="Square", value="square")
+])
+async def qwen_wan_cmd(interaction: discord.Interaction, prompt: str, aspect: str = None, lora_strength: float = None):
+    await interaction.response.defer()
+
+    result = await queued(interaction, 'comfyui', lambda: comfyui.generate(prompt, aspect=aspect, lora_strength=lora_strength, number=1))
+
+    await interaction.followup.send(
+        f"> {prompt}",
+        file=await image_file(result["images"][0], 'generated')
+    )
+
+@bot.tree.command(name="enhanced-qwen-wan", description="LoRA 이미지 생성 (prompt enhance)")
+@discord.app_commands.choices(aspect=[
+    discord.app_commands.Choice(name="Portrait", value="portrait"),
+    discord.app_commands.Choice(name="Landscape", value="landscape"),
+    discord.app_commands.Choice(name="Square", value="square")
+])
+async def enhanced_qwen_wan_cmd(interaction: discord.Interaction, prompt: str, aspect: str = None, lora_strength: float = None):
+    await interaction.response.defer()
+
+    # Enhance before queueing so the LLM round-trip does not hold a ComfyUI slot
+    enhanced = await enhance_for_image(prompt)
+    result = await queued(interaction, 'comfyui', lambda: comfyui.generate(enhanced, aspect=aspect, lora_strength=lora_strength, number=1))
+
+    await interaction.followup.send(
+        f"> {prompt}\n\n**Enhanced:** {enhanced}",
+        file=await image_file(result["images"][0], 'generated')
+    )
+
+@bot.tree.command(name="nukki-enhanced-qwen-wan", description="LoRA 이미지 생성 (prompt enhance + background removal)")
+@discord.app_commands.choices(aspect=[
+    discord.app_commands.Choice(name="Portrait", value="portrait"),
+    discord.app_commands.Choice(name="Landscape", value="landscape"),
+    discord.app_commands.Choice(name="Square", value="square")
+])
+async def nukki_enhanced_qwen_wan_cmd(interaction: discord.Interaction, prompt: str, aspect: str = None, lora_strength: float = None):
+    await interaction.response.defer()
+
+    # Append "no background" to prompt for enhancement
+    enhanced = await enhance_for_image(f"{prompt}, no background")
+    result = await queued(interaction, 'comfyui', lambda: comfyui.generate(enhanced, aspect=aspect, lora_strength=lora_strength, number=1))
+
+    # Run nukki background removal on the warm segmentation workers
+    # Not cached: a freshly generated image is never seen again and would only evict reusable entries
+    nukki_data = await nukki_service.remove(result["images"][0])
+
+    await interaction.followup.send(
+        f"> {prompt}\n\n**Enhanced:** {enhanced}",
+        file=await image_file(nukki_data, 'generated_nukki')
+    )
+
+@bot.tree.command(name="cathy-gen", description="Cathy workflow 이미지 생성")
+@discord.app_commands.choices(aspect=[
+    discord.app_commands.Choice(name="Portrait", value="portrait"),
+    discord.app_commands.Choice(name="Landscape", value="landscape"),
+    discord.app_commands.Choice(name="Square", value="square")
+])
+async def cathy_gen_cmd(interaction: discord.Interaction, prompt: str, aspect: str = None, number: int = 4):
+    await interaction.response.defer()
+
+    try:
+        async with queue_slot(interaction, 'comfyui', priority=PRIORITY_LOW if number > 1 else PRIORITY_NORMAL):
+            await send_images(interaction, comfyui.iter_images(prompt, workflow='cathy.json', aspect=aspect, number=number),
+                              f"> {prompt}", 'cathy')
+    except Exception as e:
+        logger.error(f"cathy-gen: {e}")
+        await interaction.followup.send(f"❌ {e}")
+
+LORAS = ["businesskim", "chouloky", "ninnin", "secretto", "sirian"]
+
+def make_gen_command(lora_name: str):
+    async def cmd(interaction: discord.Interaction, prompt: str, number: int = 2):
+        await interaction.response.defer()
+        try:
+            async with queue_slot(interaction, 'modal', priority=PRIORITY_LOW if number > 1 else PRIORITY_NORMAL):
+                await send_images(interaction, lora_batcher.submit(prompt, lora_name, number, interaction.user.id),
+                                  f"> {prompt}", lora_name)
+        except Exception as e:
+            logger.error(f"{lora_name}-gen: {e}")
+            await interaction.followup.send(f"❌ {e}")
+    return cmd
+
+for lora in LORAS:
+    cmd = make_gen_command(lora)
+    bot.tree.command(name=f"{lora}-gen", description=f"{lora.capitalize()} 이미지 생성")(cmd)
+
+@bot.tree.command(name="setmodel-llm", description="Set your LLM model")
+@discord.app_commands.choices(model=[discord.app_commands.Choice(name=m, value=m) for m in REGULAR_MODELS])
+async def setmodelllm_cmd(interaction: discord.Interaction, model: str):
+    await prefs.set(interaction.user.id, 'llm', model)
+    await interaction.response.send_message(f"LLM model: {model}")
+
+@bot.tree.command(name="setmodel-structured", description="Set your structured model")
+@discord.app_commands.choices(model=[discord.app_commands.Choice(name=m, value=m) for m in STRUCTURED_MODELS])
+async def setmodelstructured_cmd(interaction: discord.Interaction, model: str):
+    await prefs.set(interaction.user.id, 'structured', model)
+    await interaction.response.send_message(f"Structured model: {model}")
+
+@bot.tree.command(name="models", description="List available models")
+async def models_cmd(interaction: discord.Interaction):
+    regular = ", ".join(REGULAR_MODELS)
+    structured = ", ".join(STRUCTURED_MODELS)
+    await interaction.response.send_message(f"**Regular:** {regular}\n**Structured:** {structured}")
+
+# Operator-only stats: hidden from members unless a server admin grants them
+@bot.tree.command(name="image-stats", description="Show image provider queue depth")
+@discord.app_commands.default_permissions(administrator=True)
+async def image_stats_cmd(interaction: discord.Interaction):
+    lines = [f"**{name} jobs:** {s['running']}/{s['limit']} running, {s['waiting']} queued, {s['rejected']} rejected, ~{s['avg_duration']:.0f}s each"
+              for name, s in scheduler.stats().items()]
+    b = lora_batcher.stats()
+    lines.append(f"**lora batches:** {b['batches']} batches, {b['requests']} requests, avg {b['avg_batch']:.1f} / max {b['max_batch']} images, avg wait {b['avg_wait']:.2f}s, {b['users']} users")
+    await interaction.response.send_message("\n".join(lines))
+
+@bot.tree.command(name="cache-stats", description="Show LLM response and image result cache stats")
+@discord.app_commands.default_permissions(administrator=True)
+async def cache_stats_cmd(interaction: discord.Interaction):
+    s = response_cache.stats()
+    r = result_cache.stats()
+    await interaction.response.send_message(
+        f"**LLM cache:** {s['hits']} hits ({s['disk_hits']} from disk), {s['misses']} misses, {s['deduped']} deduped, {s['entries']} entries\n"
+        f"**Image cache:** {r['hits']} hits ({r['disk_hits']} from disk), {r['misses']} misses, {r['deduped']} deduped, "
+        f"{r['entries']} in memory ({r['memory_bytes'] / 2**20:.1f} MiB)")
+
+@bot.tree.command(name="llm-stats", description="Show per-model LLM latency and error rates")
+@discord.app_commands.default_permissions(administrator=True)
+async def llm_stats_cmd(interaction: discord.Interaction):
+    lines = []
+    for model, s in sorted(router.stats().items()):
+        p95 = f"{s['p95']:.1f}s" if s['p95'] is not None else "n/a"
+        errors = f"{s['error_rate']:.0%}" if s['error_rate'] is not None else "n/a"
+        lines.append(f"**{model}:** p95 {p95}, errors {errors} ({s['samples']} samples)")
+    await interaction.response.send_message("\n".join(lines) or "No LLM requests yet")
+
+@bot.tree.command(name="list-commands", description="List all prefix commands")
+async def list_commands_cmd(interaction: discord.Interaction):
+    commands_list = """**Prefix Commands (!):**
+• `!llm <prompt>` - Ask LLM (supports reply context)
+• `!i2i <prompt>` - Transform image (reply to or attach image)
+• `!nukki` - Remove background (reply to or attach image)
+• `!enhance <prompt>` - Enhance prompt for image generation"""
+    await interaction.response.send_message(commands_list)
+
+async def main():
+    discord.utils.setup_logging()
+    async with bot:
+        try:
+            await bot.start(os.getenv('DISCORD_BOT_TOKEN'))
+        finally:
+            # Flush pending preference writes and release shared resources
+            await prefs.close()
+            result_cache.close()
+            await close_session()
+            await nukki_service.stop()
+            await providers.close()
+            workers.shutdown()
+            await metrics.stop()
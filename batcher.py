@@ -0,0 +1,136 @@
+import os
+import time
+import asyncio
+from collections import defaultdict, deque
+import metrics
+
+# Opt-in hold before a batch is sent. Only exact (lora, prompt) matches can merge, so waiting
+# rarely pays off; 0 sends at once while still merging requests that arrive in the same loop tick
+BATCH_WINDOW = float(os.getenv('GEN_BATCH_WINDOW', '0'))
+MAX_BATCH_IMAGES = int(os.getenv('GEN_MAX_BATCH_IMAGES', '8'))
+
+class Job:
+    def __init__(self, user_id, number):
+        self.user_id = user_id
+        self.number = number
+        self.enqueued = time.monotonic()
+        self.received = 0
+        # Images as they arrive, then None when done (or the exception that ended the batch)
+        self.results = asyncio.Queue()
+
+    def finish(self, error=None):
+        self.results.put_nowait(error)
+
+class GenBatcher:
+    """Holds LoRA generation requests for a short window and merges identical ones into one backend call.
+
+    The Modal endpoint takes a single prompt per call, so only requests with the same
+    (lora_name, prompt) can share a batch. Jobs are packed round-robin across users so
+    one user's burst cannot push everyone else into a later batch. `generate` is an async
+    iterator over images, and each image is handed to its job as soon as it arrives.
+    """
+
+    def __init__(self, generate, window=BATCH_WINDOW, max_batch=MAX_BATCH_IMAGES):
+        self.generate = generate
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}
+        self.batches = 0
+        self.requests = 0
+        self.images = 0
+        self.max_batch_seen = 0
+        self.total_wait = 0.0
+        self.user_images = defaultdict(int)
+
+    async def submit(self, prompt, lora_name, number, user_id):
+        """Yield this request's images as the shared batch produces them."""
+        key = (lora_name, prompt)
+        job = Job(user_id, number)
+        if key not in self._pending:
+            self._pending[key] = []
+            asyncio.create_task(self._flush_after(key))
+        self._pending[key].append(job)
+        while True:
+            item = await job.results.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    async def _flush_after(self, key):
+        await asyncio.sleep(self.window)
+        jobs = self._pending.pop(key)
+        for batch in self._pack(jobs):
+            asyncio.create_task(self._run(key, batch))
+
+    def _pack(self, jobs):
+        # Round-robin over users, starting a new batch whenever the next job would overflow it
+        queues = defaultdict(deque)
+        for job in jobs:
+            queues[job.user_id].append(job)
+        order = []
+        while queues:
+            for user_id in list(queues):
+                order.append(queues[user_id].popleft())
+                if not queues[user_id]:
+                    del queues[user_id]
+
+        batches, batch, size = [], [], 0
+        for job in order:
+            if batch and size + job.number > self.max_batch:
+                batches.append(batch)
+                batch, size = [], 0
+            batch.append(job)
+            size += job.number
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _run(self, key, batch):
+        lora_name, prompt = key
+        total = sum(job.number for job in batch)
+        now = time.monotonic()
+        self.batches += 1
+        self.requests += len(batch)
+        self.images += total
+        self.max_batch_seen = max(self.max_batch_seen, total)
+        self.total_wait += sum(now - job.enqueued for job in batch)
+        metrics.observe("lora_batch_images", total, lora=lora_name)
+        for job in batch:
+            metrics.observe("queue_wait_seconds", now - job.enqueued, queue="lora_batch")
+
+        # Images arrive in order; the first job.number go to the first job, and so on
+        pending = deque(batch)
+        images = self.generate(prompt, lora_name, total)
+        try:
+            with metrics.timer("image_stage_seconds", stage="modal", lora=lora_name):
+                async for image in images:
+                    if not pending:
+                        break
+                    job = pending[0]
+                    job.results.put_nowait(image)
+                    job.received += 1
+                    self.user_images[job.user_id] += 1
+                    if job.received == job.number:
+                        pending.popleft().finish()
+                # Release the HTTP response now rather than whenever the generator is collected
+                await images.aclose()
+        except Exception as e:
+            for job in pending:
+                job.finish(e)
+            return
+
+        for job in pending:
+            job.finish()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "images": self.images,
+            "avg_batch": self.images / self.batches if self.batches else 0.0,
+            "max_batch": self.max_batch_seen,
+            "avg_wait": self.total_wait / self.requests if self.requests else 0.0,
+            "users": len(self.user_images),
+        }
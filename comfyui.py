@@ -0,0 +1,109 @@
+import os
+import json
+import random
+import asyncio
+import metrics
+from http_client import get_session
+
+COMFYUI_URL = os.getenv('COMFYUI_URL', 'https://62jzbahi7pnemf-3000.proxy.runpod.net')
+WORKFLOW_DIR = os.path.join(os.path.dirname(__file__), 'scripts')
+DEFAULT_WORKFLOW = os.getenv('QWEN_WAN_WORKFLOW', 'QWEN_WAN.json')
+POLL_INTERVAL = 2
+# Give up on a prompt (and free its slot) well inside Discord's 15-minute interaction lifetime
+COMFYUI_TIMEOUT = float(os.getenv('COMFYUI_TIMEOUT', '420'))
+DEFAULT_ASPECT = "portrait"
+DEFAULT_LORA_STRENGTH = 0.8
+
+ASPECTS = {
+    "portrait": (960, 1920),
+    "landscape": (1920, 960),
+    "square": (1280, 1280),
+}
+
+_workflows = {}
+
+def load_workflow(name):
+    if name not in _workflows:
+        with open(os.path.join(WORKFLOW_DIR, name)) as f:
+            _workflows[name] = json.load(f)
+    # Deep copy so per-request edits never leak into the cached template
+    return json.loads(json.dumps(_workflows[name]))
+
+def build_workflow(name, prompt, aspect, lora_strength, number):
+    if aspect not in ASPECTS:
+        raise ValueError(f"Invalid aspect: {aspect}")
+    width, height = ASPECTS[aspect]
+    workflow = load_workflow(name)
+    workflow["434"]["inputs"]["text1"] = prompt
+    workflow["129"]["inputs"]["width"] = width
+    workflow["129"]["inputs"]["height"] = height
+    workflow["129"]["inputs"]["batch_size"] = number
+    workflow["135"]["inputs"]["lora_2"]["strength"] = lora_strength
+    workflow["136"]["inputs"]["seed"] = random.getrandbits(45)
+    workflow["160"]["inputs"]["seed"] = random.getrandbits(45)
+    return workflow
+
+async def generate(prompt, workflow=DEFAULT_WORKFLOW, aspect=None, lora_strength=None, number=4):
+    """Queue a ComfyUI workflow and return {"prompt": prompt, "images": [png bytes]}."""
+    images = [image async for image in iter_images(prompt, workflow, aspect, lora_strength, number)]
+    if not images:
+        raise RuntimeError("ComfyUI produced no images")
+    return {"prompt": prompt, "images": images}
+
+async def _wait_for_history(session, prompt_id):
+    """Poll /history until the prompt completes; raise if ComfyUI reports an execution error."""
+    while True:
+        async with session.get(f"{COMFYUI_URL}/history/{prompt_id}") as resp:
+            resp.raise_for_status()
+            history = (await resp.json()).get(prompt_id, {})
+        status = history.get("status", {})
+        if status.get("status_str") == "error":
+            raise RuntimeError(f"ComfyUI prompt {prompt_id} failed: {_error_message(status)}")
+        if status.get("completed"):
+            return history
+        await asyncio.sleep(POLL_INTERVAL)
+
+def _error_message(status):
+    for kind, data in status.get("messages", []):
+        if kind == "execution_error":
+            return f"{data.get('node_type')}: {data.get('exception_message', '').strip()}"
+    return "execution error"
+
+async def _cancel(session, prompt_id):
+    # Drop the prompt from ComfyUI's queue so it doesn't run after we've given up (no-op if it already started)
+    try:
+        async with session.post(f"{COMFYUI_URL}/queue", json={"delete": [prompt_id]}) as resp:
+            resp.raise_for_status()
+    except Exception as e:
+        print(f"[comfyui] Could not cancel prompt {prompt_id}: {e}", flush=True)
+
+async def iter_images(prompt, workflow=DEFAULT_WORKFLOW, aspect=None, lora_strength=None, number=4):
+    """Queue a ComfyUI workflow and yield each output's PNG bytes as soon as it is fetched.
+
+    ComfyUI reports a batch's outputs together when the prompt completes, so this saves the
+    time to fetch the rest of the batch and holds one image at a time, not the whole batch.
+    Concurrency is capped by the job scheduler's "comfyui" backend, which callers run under.
+    """
+    aspect = aspect or DEFAULT_ASPECT
+    lora_strength = DEFAULT_LORA_STRENGTH if lora_strength is None else lora_strength
+    payload = {"prompt": build_workflow(workflow, prompt, aspect, lora_strength, number)}
+
+    session = get_session()
+    with metrics.timer("image_stage_seconds", stage="comfyui", workflow=workflow):
+        async with session.post(f"{COMFYUI_URL}/prompt", json=payload) as resp:
+            resp.raise_for_status()
+            prompt_id = (await resp.json())["prompt_id"]
+
+        try:
+            async with asyncio.timeout(COMFYUI_TIMEOUT):
+                history = await _wait_for_history(session, prompt_id)
+        except TimeoutError:
+            await _cancel(session, prompt_id)
+            raise TimeoutError(f"ComfyUI prompt {prompt_id} did not finish within {COMFYUI_TIMEOUT:.0f}s")
+
+    for image in history["outputs"]["157"]["images"]:
+        params = {"filename": image["filename"], "subfolder": image["subfolder"], "type": "output"}
+        async with session.get(f"{COMFYUI_URL}/view", params=params) as resp:
+            resp.raise_for_status()
+            data = await resp.read()
+        yield data
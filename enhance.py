@@ -0,0 +1,22 @@
+from llm import achat_response, DEFAULT_MODEL
+
+ENHANCE_MODEL = DEFAULT_MODEL
+
+# Fixed instructions live in the system prompt, marked cacheable so Anthropic prompt caching can reuse them
+ENHANCE_SYSTEM = [{
+    "type": "text",
+    "text": "Convert the user's prompt into a detailed English image generation prompt. Prefix it with 'digital anime illustration of'. Be concise and focused on visual details only. Do not include any explanations, just output the enhanced prompt.",
+    "cache_control": {"type": "ephemeral"},
+}]
+
+async def enhance_prompt(prompt, model=ENHANCE_MODEL):
+    """Rewrite a prompt for image generation; returns {"prompt", "enhanced", "ok"}.
+
+    On failure "enhanced" falls back to the original prompt and "ok" is False.
+    """
+    try:
+        enhanced = (await achat_response([{"role": "user", "content": prompt}], system=ENHANCE_SYSTEM, model=model, cache=True)).strip()
+    except Exception as e:
+        print(f"[enhance] Enhancement failed, using original prompt: {e}", flush=True)
+        return {"prompt": prompt, "enhanced": prompt, "ok": False}
+    return {"prompt": prompt, "enhanced": enhanced or prompt, "ok": bool(enhanced)}
@@ -0,0 +1,85 @@
+import os
+import aiohttp
+import metrics
+
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '30'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+MODAL_TIMEOUT = float(os.getenv('MODAL_TIMEOUT', '300'))
+MAX_DOWNLOAD_BYTES = int(os.getenv('MAX_DOWNLOAD_BYTES', str(25 * 1024 * 1024)))
+CHUNK_SIZE = 64 * 1024
+
+_session = None
+
+class DownloadTooLarge(Exception):
+    pass
+
+def get_session():
+    """Bot-lifetime aiohttp session; keeps connections to Discord CDN, Modal and ComfyUI alive."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=100, limit_per_host=20, keepalive_timeout=60, ttl_dns_cache=300)
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+        )
+    return _session
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+async def download(url, max_bytes=MAX_DOWNLOAD_BYTES):
+    """Stream a URL into memory, giving up as soon as it exceeds max_bytes."""
+    with metrics.timer("image_stage_seconds", stage="download"):
+        data = await _download(url, max_bytes)
+    metrics.observe("download_bytes", len(data))
+    return data
+
+async def _download(url, max_bytes):
+    async with get_session().get(url) as resp:
+        resp.raise_for_status()
+        if resp.content_length is not None and resp.content_length > max_bytes:
+            raise DownloadTooLarge(f"{resp.content_length} bytes exceeds the {max_bytes} byte limit")
+        data = bytearray()
+        async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+            data.extend(chunk)
+            if len(data) > max_bytes:
+                raise DownloadTooLarge(f"Download exceeds the {max_bytes} byte limit")
+    return bytes(data)
+
+async def iter_json_strings(resp, key, max_bytes=MAX_DOWNLOAD_BYTES):
+    """Yield each string of the JSON array under `key` from a streamed response body as soon as it is complete.
+
+    Only for arrays of escape-free strings (e.g. base64), which is what lets this skip a full JSON
+    parse and hold one item in memory instead of the whole body. max_bytes bounds a single item.
+    """
+    json_key = f'"{key}"'.encode()
+    buffer = bytearray()
+    in_array = False
+    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+        buffer.extend(chunk)
+        while True:
+            if not in_array:
+                start = buffer.find(json_key)
+                bracket = buffer.find(b'[', start + len(json_key)) if start >= 0 else -1
+                if bracket < 0:
+                    if len(buffer) > max_bytes:
+                        raise DownloadTooLarge(f"No {key!r} array within the first {max_bytes} bytes")
+                    break
+                del buffer[:bracket + 1]
+                in_array = True
+            quote = buffer.find(b'"')
+            close = buffer.find(b']')
+            if close >= 0 and (quote < 0 or close < quote):
+                return
+            end = buffer.find(b'"', quote + 1) if quote >= 0 else -1
+            if end < 0:
+                if len(buffer) > max_bytes:
+                    raise DownloadTooLarge(f"JSON item exceeds the {max_bytes} byte limit")
+                break
+            yield bytes(buffer[quote + 1:end])
+            del buffer[:end + 1]
+    if not in_array:
+        raise ValueError(f"Response has no {key!r} array")
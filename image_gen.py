@@ -0,0 +1,38 @@
+import os
+from dotenv import load_dotenv
+import providers
+import metrics
+
+load_dotenv(os.path.expanduser('~/.env'))
+load_dotenv()
+
+def _gemini():
+    from google import genai
+    return genai.Client()
+
+providers.register('gemini', _gemini)
+
+GEMINI_IMAGE_MODEL = "gemini-2.5-flash-image"
+
+def image_part(data, mime_type):
+    """Already-encoded image bytes as request content, so the SDK does not re-encode them.
+
+    The dict form of a Part avoids importing google.genai.types on the event loop.
+    """
+    return {"inline_data": {"data": data, "mime_type": mime_type}}
+
+async def gemini_image(contents):
+    """Render with Gemini on the SDK's async client and return the first image's encoded bytes (or None).
+
+    Callers go through the job scheduler's "gemini" backend, which caps concurrent requests.
+    """
+    with metrics.timer("image_stage_seconds", stage="gemini"):
+        response = await providers.get('gemini').aio.models.generate_content(
+            model=GEMINI_IMAGE_MODEL,
+            contents=contents
+        )
+
+    for part in response.candidates[0].content.parts:
+        if part.inline_data is not None:
+            return part.inline_data.data
+    return None
@@ -0,0 +1,35 @@
+import os
+import discord
+from io import BytesIO
+import workers
+import metrics
+
+# Formats Discord previews inline; anything else is transcoded before upload
+INLINE_FORMATS = {"png": "png", "jpeg": "jpg", "webp": "webp", "gif": "gif"}
+# Set to "webp" (lossless) or "png" (optimized) to shrink uploads at some CPU cost; empty passes bytes through
+IMAGE_OUTPUT_FORMAT = os.getenv('IMAGE_OUTPUT_FORMAT', '').lower()
+if IMAGE_OUTPUT_FORMAT not in ("", "webp", "png"):
+    raise ValueError(f"IMAGE_OUTPUT_FORMAT must be empty, 'webp' or 'png', not {IMAGE_OUTPUT_FORMAT!r}")
+
+def sniff_format(data):
+    """Identify an encoded image from its magic bytes without copying it."""
+    header = memoryview(data)[:12]
+    if header[:8] == b'\x89PNG\r\n\x1a\n':
+        return "png"
+    if header[:3] == b'\xff\xd8\xff':
+        return "jpeg"
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return "webp"
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return "gif"
+    return None
+
+async def image_file(data, name):
+    """Wrap encoded image bytes in a discord.File, transcoding only when required or configured."""
+    fmt = sniff_format(data)
+    if fmt not in INLINE_FORMATS or (IMAGE_OUTPUT_FORMAT and fmt not in ("gif", IMAGE_OUTPUT_FORMAT)):
+        fmt = IMAGE_OUTPUT_FORMAT or "png"
+        with metrics.timer("image_stage_seconds", stage="transcode", format=fmt):
+            data = await workers.run_cpu(workers.transcode, data, fmt)
+    # BytesIO over an immutable bytes object shares its buffer instead of copying it
+    return discord.File(BytesIO(data), filename=f"{name}.{INLINE_FORMATS[fmt]}")
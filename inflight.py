@@ -0,0 +1,34 @@
+import asyncio
+from contextlib import contextmanager
+
+class Inflight:
+    """Calls in progress by key, so concurrent callers asking for the same result share one computation."""
+
+    def __init__(self):
+        self._futures = {}
+        self.deduped = 0
+
+    def __contains__(self, key):
+        return key in self._futures
+
+    async def join(self, key):
+        """Wait for the in-flight result; shielded so a cancelled follower leaves it running."""
+        self.deduped += 1
+        return await asyncio.shield(self._futures[key])
+
+    @contextmanager
+    def lead(self, key, future):
+        """Publish `future` as the in-flight result for `key` for the duration of the block."""
+        self._futures[key] = future
+        try:
+            yield future
+        finally:
+            self._futures.pop(key, None)
+
+    async def run(self, key, compute):
+        """Await compute() once for every concurrent caller; returns (value, whether this caller ran it)."""
+        if key in self._futures:
+            return await self.join(key), False
+        with self.lead(key, asyncio.ensure_future(compute())) as task:
+            value = await asyncio.shield(task)
+        return value, True
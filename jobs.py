@@ -0,0 +1,188 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from collections import defaultdict
+from contextlib import asynccontextmanager
+import metrics
+
+# Lower runs first
+PRIORITY_HIGH = 0    # cheap, single-shot work (background removal, LLM-backed steps)
+PRIORITY_NORMAL = 1  # single image renders
+PRIORITY_LOW = 2     # multi-image batches
+
+# backend -> (max running, max waiting, initial duration guess in seconds)
+# These are the only concurrency caps on the backends. All limits and quotas here are per process;
+# scripts/launch_shards.py divides the JOB_LIMIT_* values between the processes it starts.
+BACKENDS = {
+    "gemini": (int(os.getenv('JOB_LIMIT_GEMINI', '4')), int(os.getenv('JOB_QUEUE_GEMINI', '20')), 15.0),
+    "comfyui": (int(os.getenv('JOB_LIMIT_COMFYUI', '2')), int(os.getenv('JOB_QUEUE_COMFYUI', '10')), 60.0),
+    "modal": (int(os.getenv('JOB_LIMIT_MODAL', '16')), int(os.getenv('JOB_QUEUE_MODAL', '32')), 45.0),
+    "nukki": (int(os.getenv('JOB_LIMIT_NUKKI', str(os.cpu_count() or 1))), int(os.getenv('JOB_QUEUE_NUKKI', '32')), 3.0),
+}
+USER_QUOTA = int(os.getenv('JOB_USER_QUOTA', '3'))
+GUILD_QUOTA = int(os.getenv('JOB_GUILD_QUOTA', '15'))
+# Interaction tokens expire after 15 minutes; refuse work we would not start well before that
+MAX_WAIT = float(os.getenv('JOB_MAX_WAIT', '600'))
+
+class JobRejected(Exception):
+    pass
+
+class QueueFull(JobRejected):
+    pass
+
+class QuotaExceeded(JobRejected):
+    pass
+
+class Job:
+    def __init__(self, priority, seq, on_position):
+        self.priority = priority
+        self.seq = seq
+        self.on_position = on_position
+        self.position = None
+        self.admitted = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class Backend:
+    def __init__(self, name, limit, max_queue, avg_duration):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.avg_duration = avg_duration
+        self.waiting = []
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def eta(self, position):
+        # Jobs ahead of us drain `limit` at a time
+        return (position // self.limit + 1) * self.avg_duration
+
+    def record(self, duration):
+        self.avg_duration = 0.8 * self.avg_duration + 0.2 * duration
+        self.completed += 1
+
+class JobScheduler:
+    """Admission control for generation backends: concurrency limits, priorities, quotas and early rejection."""
+
+    def __init__(self, backends=BACKENDS, user_quota=USER_QUOTA, guild_quota=GUILD_QUOTA, max_wait=MAX_WAIT):
+        self.backends = {name: Backend(name, *config) for name, config in backends.items()}
+        self.user_quota = user_quota
+        self.guild_quota = guild_quota
+        self.max_wait = max_wait
+        self.user_jobs = defaultdict(int)
+        self.guild_jobs = defaultdict(int)
+        self._seq = itertools.count()
+
+    async def run(self, backend_name, fn, user_id=None, guild_id=None, priority=PRIORITY_NORMAL, on_position=None):
+        """Wait for a slot on the backend, then await fn(). on_position(position, eta) is called while queued."""
+        async with self.slot(backend_name, user_id, guild_id, priority, on_position):
+            return await fn()
+
+    @asynccontextmanager
+    async def slot(self, backend_name, user_id=None, guild_id=None, priority=PRIORITY_NORMAL, on_position=None):
+        """Hold a backend slot for the body of an `async with`, e.g. while consuming a result stream."""
+        backend = self.backends[backend_name]
+        self._admit_check(backend, user_id, guild_id)
+
+        self.user_jobs[user_id] += 1
+        if guild_id is not None:
+            self.guild_jobs[guild_id] += 1
+        try:
+            queued_at = time.perf_counter()
+            if backend.running < backend.limit and not backend.waiting:
+                backend.running += 1
+            else:
+                await self._wait_for_slot(backend, priority, on_position)
+            metrics.observe("job_queue_wait_seconds", time.perf_counter() - queued_at, backend=backend.name, priority=priority)
+
+            start = time.monotonic()
+            try:
+                yield
+            finally:
+                backend.record(time.monotonic() - start)
+                backend.running -= 1
+                self._dispatch(backend)
+        finally:
+            self.user_jobs[user_id] -= 1
+            if not self.user_jobs[user_id]:
+                del self.user_jobs[user_id]
+            if guild_id is not None:
+                self.guild_jobs[guild_id] -= 1
+                if not self.guild_jobs[guild_id]:
+                    del self.guild_jobs[guild_id]
+
+    def _admit_check(self, backend, user_id, guild_id):
+        try:
+            self._check_limits(backend, user_id, guild_id)
+        except JobRejected as e:
+            backend.rejected += 1
+            metrics.inc("jobs_rejected_total", backend=backend.name, reason=type(e).__name__)
+            raise
+
+    def _check_limits(self, backend, user_id, guild_id):
+        if user_id is not None and self.user_jobs.get(user_id, 0) >= self.user_quota:
+            raise QuotaExceeded(f"You already have {self.user_quota} jobs running or queued")
+        if guild_id is not None and self.guild_jobs.get(guild_id, 0) >= self.guild_quota:
+            raise QuotaExceeded("This server has too many jobs running or queued, try again shortly")
+        if backend.running >= backend.limit:
+            if len(backend.waiting) >= backend.max_queue or backend.eta(len(backend.waiting)) > self.max_wait:
+                raise QueueFull(f"The {backend.name} queue is full, try again shortly")
+
+    async def _wait_for_slot(self, backend, priority, on_position):
+        job = Job(priority, next(self._seq), on_position)
+        heapq.heappush(backend.waiting, job)
+        self._report_positions(backend)
+        try:
+            await job.admitted
+        except asyncio.CancelledError:
+            if job.admitted.done() and not job.admitted.cancelled():
+                # Admitted just before being cancelled; give the slot back
+                backend.running -= 1
+                self._dispatch(backend)
+            elif job in backend.waiting:
+                backend.waiting.remove(job)
+                heapq.heapify(backend.waiting)
+                self._report_positions(backend)
+            raise
+
+    def _dispatch(self, backend):
+        while backend.running < backend.limit and backend.waiting:
+            job = heapq.heappop(backend.waiting)
+            if job.admitted.done():
+                continue
+            backend.running += 1
+            job.admitted.set_result(None)
+        self._report_positions(backend)
+
+    def _report_positions(self, backend):
+        for position, job in enumerate(sorted(backend.waiting), start=1):
+            if job.position != position and job.on_position is not None:
+                job.position = position
+                asyncio.create_task(self._notify(job, position, backend.eta(position - 1)))
+
+    async def _notify(self, job, position, eta):
+        if job.admitted.done():
+            return
+        try:
+            await job.on_position(position, eta)
+        except Exception as e:
+            print(f"[jobs] Queue position update failed: {e}", flush=True)
+
+    def stats(self):
+        return {
+            name: {
+                "limit": b.limit,
+                "running": b.running,
+                "waiting": len(b.waiting),
+                "completed": b.completed,
+                "rejected": b.rejected,
+                "avg_duration": b.avg_duration,
+            }
+            for name, b in self.backends.items()
+        }
+
+scheduler = JobScheduler()
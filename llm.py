@@ -1,55 +1,206 @@
 import json
 import os
+import time
 from dotenv import load_dotenv
-from anthropic import Anthropic
-from openai import OpenAI
+from llm_cache import response_cache, cache_key
+import providers
+from router import router, is_retryable, LLM_ATTEMPT_TIMEOUT
+import metrics
 
 load_dotenv(os.path.expanduser('~/.env'))
 
-client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
-openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# Max pooled connections per async client; each client keeps one pool for the bot lifetime
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE = 20
+
+def _anthropic():
+    from anthropic import Anthropic
+    return Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), timeout=LLM_ATTEMPT_TIMEOUT)
+
+def _openai():
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv('OPENAI_API_KEY'), timeout=LLM_ATTEMPT_TIMEOUT)
+
+def _async_anthropic():
+    import httpx
+    from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+    # Retries, timeouts and failover are handled by router.py
+    return AsyncAnthropic(
+        api_key=os.getenv('ANTHROPIC_API_KEY'),
+        max_retries=0,
+        http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE))
+    )
+
+def _async_openai():
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    return AsyncOpenAI(
+        api_key=os.getenv('OPENAI_API_KEY'),
+        max_retries=0,
+        http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE))
+    )
+
+providers.register('anthropic', _anthropic)
+providers.register('openai', _openai)
+providers.register('async_anthropic', _async_anthropic)
+providers.register('async_openai', _async_openai)
 
 # Available models
 CLAUDE_MODELS = ["claude-sonnet-4-5", "claude-haiku-4-5"]
 OPENAI_MODELS = ["gpt-4o", "gpt-4o-mini", "gpt-4-turbo", "o1", "o1-mini"]
-STRUCTURED_MODELS = OPENAI_MODELS  # Only OpenAI supports structured output
+# Only these accept json_schema structured outputs (gpt-4-turbo does not; o1-mini also rejects system messages)
+STRUCTURED_MODELS = ["gpt-4o", "gpt-4o-mini"]
+
+# Reasoning models stream nothing until they finish thinking, so their first token gets the whole attempt
+REASONING_MODELS = ["o1", "o1-mini"]
 
 REGULAR_MODELS = CLAUDE_MODELS + OPENAI_MODELS
 DEFAULT_MODEL = "claude-sonnet-4-5"
 DEFAULT_STRUCTURED_MODEL = "gpt-4o"
 
-def chat_response(chat_messages, system=None, schema=None, model=None):
-    model = model or (DEFAULT_STRUCTURED_MODEL if schema else DEFAULT_MODEL)
+# Where a request goes when its model is slow, overloaded or failing
+FALLBACK_MODELS = {
+    "claude-sonnet-4-5": "claude-haiku-4-5",
+    "claude-haiku-4-5": "gpt-4o-mini",
+    "gpt-4o": "gpt-4o-mini",
+    "gpt-4-turbo": "gpt-4o-mini",
+    "gpt-4o-mini": "claude-haiku-4-5",
+    "o1": "o1-mini",
+    "o1-mini": "gpt-4o-mini",
+}
+
+router.first_token_timeouts.update({model: LLM_ATTEMPT_TIMEOUT for model in REASONING_MODELS})
 
+def _fallback(model, schema=None):
+    fallback = FALLBACK_MODELS.get(model)
+    if schema and fallback not in STRUCTURED_MODELS:
+        return None
+    return fallback
+
+def _openai_kwargs(chat_messages, system, schema, model):
+    messages = chat_messages.copy()
+    if system:
+        messages.insert(0, {"role": "system", "content": system})
+    kwargs = {"model": model, "messages": messages}
     if schema:
-        # Structured output only works with OpenAI
-        messages = chat_messages.copy()
-        if system:
-            messages.insert(0, {"role": "system", "content": system})
-        response = openai_client.chat.completions.create(
-            model=model,
-            messages=messages,
-            response_format={"type": "json_schema", "json_schema": {"name": "response", "strict": True, "schema": schema}}
-        )
-        return json.loads(response.choices[0].message.content)
-
-    # Regular text generation - route to appropriate provider
+        kwargs["response_format"] = {"type": "json_schema", "json_schema": {"name": "response", "strict": True, "schema": schema}}
+    return kwargs
+
+def _claude_kwargs(chat_messages, system, model):
+    kwargs = {"model": model, "max_tokens": 8192, "messages": chat_messages}
+    if system:
+        kwargs["system"] = system
+    return kwargs
+
+def chat_response(chat_messages, system=None, schema=None, model=None, cache=False):
+    model = model or (DEFAULT_STRUCTURED_MODEL if schema else DEFAULT_MODEL)
+    if not cache:
+        return _chat_response(chat_messages, system, schema, model)
+
+    key = cache_key(model, system, chat_messages, schema)
+    hit, value = response_cache.get(key)
+    if not hit:
+        value = _chat_response(chat_messages, system, schema, model)
+        response_cache.set(key, value)
+    return value
+
+def _provider(model, schema=None):
+    return "openai" if schema or model in OPENAI_MODELS else "anthropic"
+
+def _chat_response(chat_messages, system, schema, model):
+    # Blocking path: the SDK's own retries, then one failover attempt (no hedging)
+    try:
+        return _call(chat_messages, system, schema, model)
+    except Exception as e:
+        fallback = _fallback(model, schema)
+        if not fallback or not is_retryable(e):
+            raise
+        metrics.inc("llm_route_total", model=model, routed=fallback, decision="failover")
+        return _call(chat_messages, system, schema, fallback)
+
+def _call(chat_messages, system, schema, model):
+    with metrics.timer("llm_request_seconds", provider=_provider(model, schema), model=model, mode="sync"):
+        if schema:
+            # Structured output only works with OpenAI
+            response = providers.get('openai').chat.completions.create(**_openai_kwargs(chat_messages, system, schema, model))
+            return json.loads(response.choices[0].message.content)
+
+        # Regular text generation - route to appropriate provider
+        if model in OPENAI_MODELS:
+            response = providers.get('openai').chat.completions.create(**_openai_kwargs(chat_messages, system, None, model))
+            return response.choices[0].message.content
+        else:
+            # Claude
+            response = providers.get('anthropic').messages.create(**_claude_kwargs(chat_messages, system, model))
+            return response.content[0].text
+
+async def achat_response(chat_messages, system=None, schema=None, model=None, cache=False):
+    model = model or (DEFAULT_STRUCTURED_MODEL if schema else DEFAULT_MODEL)
+    if not cache:
+        return await _achat_response(chat_messages, system, schema, model)
+
+    key = cache_key(model, system, chat_messages, schema)
+    return await response_cache.get_or_compute(key, lambda: _achat_response(chat_messages, system, schema, model))
+
+async def _achat_response(chat_messages, system, schema, model):
+    return await router.run(model, lambda routed: _acall(chat_messages, system, schema, routed), fallback=_fallback(model, schema))
+
+async def _acall(chat_messages, system, schema, model):
+    with metrics.timer("llm_request_seconds", provider=_provider(model, schema), model=model, mode="async"):
+        if schema:
+            response = await providers.get('async_openai').chat.completions.create(**_openai_kwargs(chat_messages, system, schema, model))
+            return json.loads(response.choices[0].message.content)
+
+        if model in OPENAI_MODELS:
+            response = await providers.get('async_openai').chat.completions.create(**_openai_kwargs(chat_messages, system, None, model))
+            return response.choices[0].message.content
+        else:
+            response = await providers.get('async_anthropic').messages.create(**_claude_kwargs(chat_messages, system, model))
+            return response.content[0].text
+
+async def astream_chat_response(chat_messages, system=None, model=None, cache=False):
+    """Yield text deltas as the provider streams them."""
+    model = model or DEFAULT_MODEL
+    if not cache:
+        async for text in _astream_chat_response(chat_messages, system, model):
+            yield text
+        return
+
+    # Cache hits and joined in-flight streams come back as a single chunk
+    key = cache_key(model, system, chat_messages, None)
+    async for text in response_cache.stream_or_join(key, lambda: _astream_chat_response(chat_messages, system, model)):
+        yield text
+
+def _astream_chat_response(chat_messages, system, model):
+    return router.stream(model, lambda routed: _astream_model(chat_messages, system, routed), fallback=_fallback(model))
+
+async def _astream_model(chat_messages, system, model):
+    provider = _provider(model)
+    with metrics.timer("llm_request_seconds", provider=provider, model=model, mode="stream"):
+        start = time.perf_counter()
+        first = True
+        async for text in _astream_provider(chat_messages, system, model):
+            if first:
+                metrics.observe("llm_first_token_seconds", time.perf_counter() - start, provider=provider, model=model)
+                first = False
+            yield text
+
+async def _astream_provider(chat_messages, system, model):
     if model in OPENAI_MODELS:
-        messages = chat_messages.copy()
-        if system:
-            messages.insert(0, {"role": "system", "content": system})
-        response = openai_client.chat.completions.create(
-            model=model,
-            messages=messages
-        )
-        return response.choices[0].message.content
+        stream = await providers.get('async_openai').chat.completions.create(**_openai_kwargs(chat_messages, system, None, model), stream=True)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
     else:
-        # Claude
-        kwargs = {"model": model, "max_tokens": 8192, "messages": chat_messages}
-        if system:
-            kwargs["system"] = system
-        response = client.messages.create(**kwargs)
-        return response.content[0].text
-
-def llm(prompt, system=None, schema=None, model=None):
-    return chat_response([{"role": "user", "content": prompt}], system=system, schema=schema, model=model)
+        async with providers.get('async_anthropic').messages.stream(**_claude_kwargs(chat_messages, system, model)) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+def llm(prompt, system=None, schema=None, model=None, cache=False):
+    return chat_response([{"role": "user", "content": prompt}], system=system, schema=schema, model=model, cache=cache)
+
+async def allm(prompt, system=None, schema=None, model=None, cache=False):
+    return await achat_response([{"role": "user", "content": prompt}], system=system, schema=schema, model=model, cache=cache)
+
+def astream_llm(prompt, system=None, model=None, cache=False):
+    return astream_chat_response([{"role": "user", "content": prompt}], system=system, model=model, cache=cache)
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from inflight import Inflight
+
+LLM_CACHE_SIZE = int(os.getenv('LLM_CACHE_SIZE', '1024'))
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', '86400'))
+LLM_CACHE_DB = os.getenv('LLM_CACHE_DB')  # e.g. ~/.cache/gen-discord/llm.sqlite3; unset keeps the cache in memory only
+LLM_CACHE_DB_SIZE = int(os.getenv('LLM_CACHE_DB_SIZE', '100000'))
+
+def cache_key(model, system, messages, schema):
+    payload = json.dumps([model, system, messages, schema], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class StreamAbandoned(Exception):
+    pass
+
+class ResponseCache:
+    """LRU + TTL cache for LLM responses with an optional SQLite tier and in-flight dedup."""
+
+    def __init__(self, max_entries=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, db_path=LLM_CACHE_DB, max_db_entries=LLM_CACHE_DB_SIZE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_db_entries = max_db_entries
+        self._memory = OrderedDict()
+        self._inflight = Inflight()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db = None
+        if db_path:
+            db_path = os.path.expanduser(db_path)
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, expires REAL, accessed REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._db.commit()
+
+    def _get_memory(self, key, now):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return False, None
+            value, expires = entry
+            if expires > now:
+                self._memory.move_to_end(key)
+                return True, value
+            del self._memory[key]
+            return False, None
+
+    def _get_disk(self, key, now):
+        with self._db_lock:
+            row = self._db.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if not row or row[1] <= now:
+                return False, None, None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return True, json.loads(row[0]), row[1]
+
+    def _set_disk(self, key, value, expires, now):
+        with self._db_lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, json.dumps(value, ensure_ascii=False), expires, now))
+            self._db.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+            # Trim least recently used rows past the size bound
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_db_entries,)
+            )
+            self._db.commit()
+
+    def _count(self, hit, disk=False):
+        if hit:
+            self.hits += 1
+            self.disk_hits += disk
+        else:
+            self.misses += 1
+
+    def get(self, key):
+        """Return (True, value) on a hit, (False, None) otherwise. Blocks on SQLite; use aget() on the event loop."""
+        now = time.time()
+        hit, value = self._get_memory(key, now)
+        if hit or self._db is None:
+            self._count(hit)
+            return hit, value
+        hit, value, expires = self._get_disk(key, now)
+        if hit:
+            self._remember(key, value, expires)
+        self._count(hit, disk=True)
+        return hit, value
+
+    async def aget(self, key):
+        """get() with the SQLite lookup moved off the event loop."""
+        now = time.time()
+        hit, value = self._get_memory(key, now)
+        if hit or self._db is None:
+            self._count(hit)
+            return hit, value
+        hit, value, expires = await asyncio.to_thread(self._get_disk, key, now)
+        if hit:
+            self._remember(key, value, expires)
+        self._count(hit, disk=True)
+        return hit, value
+
+    def set(self, key, value):
+        now = time.time()
+        self._remember(key, value, now + self.ttl)
+        if self._db is not None:
+            self._set_disk(key, value, now + self.ttl, now)
+
+    async def aset(self, key, value):
+        now = time.time()
+        self._remember(key, value, now + self.ttl)
+        if self._db is not None:
+            await asyncio.to_thread(self._set_disk, key, value, now + self.ttl, now)
+
+    def _remember(self, key, value, expires):
+        with self._lock:
+            self._memory[key] = (value, expires)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    async def get_or_compute(self, key, compute):
+        """Serve from cache, or await compute() once no matter how many callers ask concurrently."""
+        hit, value = await self.aget(key)
+        if hit:
+            return value
+        value, led = await self._inflight.run(key, compute)
+        if led:
+            await self.aset(key, value)
+        return value
+
+    async def stream_or_join(self, key, stream):
+        """Yield a cached text response, or stream it once for all concurrent identical callers.
+
+        The first caller streams `stream()` and stores the joined text. Callers arriving while it
+        runs get the finished text as one chunk; if the first caller stops early they stream it themselves.
+        """
+        hit, value = await self.aget(key)
+        if hit:
+            yield value
+            return
+        if key in self._inflight:
+            try:
+                value = await self._inflight.join(key)
+            except StreamAbandoned:
+                pass
+            else:
+                yield value
+                return
+            async for text in stream():
+                yield text
+            return
+
+        parts = []
+        with self._inflight.lead(key, asyncio.get_running_loop().create_future()) as future:
+            try:
+                async for text in stream():
+                    parts.append(text)
+                    yield text
+            except BaseException as e:
+                # Cancellation or an early close by the consumer isn't an error followers should re-raise
+                future.set_exception(e if isinstance(e, Exception) else StreamAbandoned())
+                # Mark it retrieved so a future nobody is waiting on doesn't log a warning
+                future.exception()
+                raise
+        value = "".join(parts)
+        future.set_result(value)
+        await self.aset(key, value)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "deduped": self._inflight.deduped,
+            "entries": len(self._memory),
+        }
+
+response_cache = ResponseCache()
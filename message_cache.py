@@ -0,0 +1,98 @@
+import os
+import re
+from collections import OrderedDict
+import discord
+
+MESSAGE_CACHE_SIZE = int(os.getenv('MESSAGE_CACHE_SIZE', '2048'))
+HISTORY_MAX_DEPTH = int(os.getenv('LLM_HISTORY_DEPTH', '20'))
+HISTORY_TOKEN_BUDGET = int(os.getenv('LLM_HISTORY_TOKENS', '6000'))
+
+# Bot replies start with the quoted prompt ("> prompt\n\n"); the rest is the model's answer
+QUOTED_PROMPT = re.compile(r'\A(?:>[^\n]*\n)+\n')
+
+class MessageCache:
+    """Bounded LRU of messages we had to fetch, checked after discord.py's own cache and before REST."""
+
+    def __init__(self, max_size=MESSAGE_CACHE_SIZE):
+        self.max_size = max_size
+        self._messages = OrderedDict()
+        self.hits = 0
+        self.fetches = 0
+
+    def put(self, message):
+        self._messages[message.id] = message
+        self._messages.move_to_end(message.id)
+        while len(self._messages) > self.max_size:
+            self._messages.popitem(last=False)
+
+    async def resolve(self, channel, reference):
+        """Return the message a reference points to, avoiding fetch_message whenever possible."""
+        if isinstance(reference.resolved, discord.Message):
+            self.hits += 1
+            return reference.resolved
+
+        message = self._messages.get(reference.message_id) or channel._state._get_message(reference.message_id)
+        if message is not None:
+            self.hits += 1
+            self.put(message)
+            return message
+
+        self.fetches += 1
+        message = await channel.fetch_message(reference.message_id)
+        self.put(message)
+        return message
+
+    async def reply_chain(self, message, max_depth=HISTORY_MAX_DEPTH):
+        """Messages this one replies to, oldest first (not including the message itself)."""
+        chain = []
+        while message.reference and message.reference.message_id and len(chain) < max_depth:
+            try:
+                message = await self.resolve(message.channel, message.reference)
+            except discord.HTTPException:
+                break
+            chain.append(message)
+        chain.reverse()
+        return chain
+
+def estimate_tokens(text):
+    # Rough: ~3 characters per token across English and Korean text
+    return len(text) // 3 + 1
+
+def message_text(message, bot_user, prefix):
+    text = message.content
+    if message.author == bot_user:
+        return QUOTED_PROMPT.sub('', text, count=1)
+    if text.startswith(f"{prefix}llm"):
+        return text[len(prefix) + 3:].strip()
+    return text
+
+def build_chat_messages(chain, prompt, bot_user, prefix='!', token_budget=HISTORY_TOKEN_BUDGET):
+    """Turn a reply chain into alternating chat messages ending with prompt, dropping the oldest turns past the budget."""
+    turns = []
+    for message in chain:
+        text = message_text(message, bot_user, prefix)
+        if text:
+            turns.append(("assistant" if message.author == bot_user else "user", text))
+
+    budget = token_budget - estimate_tokens(prompt)
+    kept = []
+    for role, text in reversed(turns):
+        budget -= estimate_tokens(text)
+        if budget < 0:
+            break
+        kept.append((role, text))
+    kept.reverse()
+
+    # Providers want a user turn first and strictly alternating roles
+    if kept and kept[0][0] == "assistant":
+        kept[0] = ("user", f"Context: {kept[0][1]}")
+    kept.append(("user", prompt))
+    chat_messages = []
+    for role, text in kept:
+        if chat_messages and chat_messages[-1]["role"] == role:
+            chat_messages[-1]["content"] += f"\n\n{text}"
+        else:
+            chat_messages.append({"role": role, "content": text})
+    return chat_messages
+
+message_cache = MessageCache()
@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from contextlib import nullcontext
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED') == '1'
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # serve /metrics in Prometheus format when set
+METRICS_DUMP_INTERVAL = float(os.getenv('METRICS_DUMP_INTERVAL', '0'))  # log a full dump every N seconds when set
+LAG_INTERVAL = 0.5
+
+BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, float('inf'))
+
+logger = logging.getLogger('metrics')
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+_histograms = {}
+_counters = {}
+_tasks = []
+_runner = None
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def observe(name, value, **labels):
+    """Record a duration (seconds) or size into a histogram."""
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = Histogram()
+    histogram.observe(value)
+    logger.debug(json.dumps({"metric": name, "value": round(value, 6), **labels}, ensure_ascii=False))
+
+def inc(name, value=1, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0) + value
+
+class _Timer:
+    __slots__ = ('name', 'labels', 'start')
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start, status='error' if exc_type else 'ok', **self.labels)
+        return False
+
+    # Also usable in `async with` alongside async context managers
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+_NOOP = nullcontext()
+
+def timer(name, **labels):
+    """`with timer("llm_request_seconds", model=m):` — a shared no-op when metrics are disabled."""
+    if not METRICS_ENABLED:
+        return _NOOP
+    return _Timer(name, labels)
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+def render():
+    """All metrics in Prometheus text exposition format."""
+    lines = []
+    for (name, labels), value in sorted(_counters.items()):
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), histogram in sorted(_histograms.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram.buckets):
+            cumulative += count
+            le = "+Inf" if bound == float('inf') else bound
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+async def _monitor_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        observe("event_loop_lag_seconds", max(0.0, loop.time() - start - LAG_INTERVAL))
+
+async def _dump_periodically():
+    while True:
+        await asyncio.sleep(METRICS_DUMP_INTERVAL)
+        logger.info("metrics dump\n%s", render())
+
+async def start():
+    """Start the loop-lag monitor plus the /metrics endpoint and periodic dump if configured."""
+    global _runner
+    if not METRICS_ENABLED or _tasks:
+        return
+    _tasks.append(asyncio.create_task(_monitor_loop_lag()))
+    if METRICS_DUMP_INTERVAL:
+        _tasks.append(asyncio.create_task(_dump_periodically()))
+    if METRICS_PORT:
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(text=render(), content_type='text/plain', charset='utf-8')
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        _runner = web.AppRunner(app)
+        await _runner.setup()
+        await web.TCPSite(_runner, '127.0.0.1', METRICS_PORT).start()
+
+async def stop():
+    global _runner
+    for task in _tasks:
+        task.cancel()
+    _tasks.clear()
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
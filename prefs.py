@@ -0,0 +1,84 @@
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+
+PREFS_DB = os.path.expanduser(os.getenv('PREFS_DB', os.path.join(os.path.dirname(__file__), 'prefs.sqlite3')))
+# How long a cached user row is trusted before re-reading, so writes from other processes show up
+PREFS_CACHE_TTL = float(os.getenv('PREFS_CACHE_TTL', '30'))
+PREFS_FLUSH_INTERVAL = float(os.getenv('PREFS_FLUSH_INTERVAL', '0.5'))
+
+class PrefStore:
+    """Per-user preferences in SQLite (WAL) behind an in-memory read-through cache.
+
+    Reads are a dict lookup once a user is cached. Writes update the cache immediately
+    and are flushed to SQLite in batches off the event loop.
+    """
+
+    def __init__(self, path=PREFS_DB, cache_ttl=PREFS_CACHE_TTL, flush_interval=PREFS_FLUSH_INTERVAL):
+        self.path = path
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval
+        self._cache = {}  # user_id -> (loaded_at, {key: value})
+        self._pending = {}  # (user_id, key) -> value
+        self._flush_task = None
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS prefs (user_id INTEGER, key TEXT, value TEXT, PRIMARY KEY (user_id, key))")
+        self._db.commit()
+
+    def _load(self, user_id):
+        with self._db_lock:
+            rows = self._db.execute("SELECT key, value FROM prefs WHERE user_id = ?", (user_id,)).fetchall()
+        return dict(rows)
+
+    def _write(self, items):
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT INTO prefs (user_id, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id, key) DO UPDATE SET value = excluded.value",
+                items
+            )
+            self._db.commit()
+
+    async def get_all(self, user_id):
+        entry = self._cache.get(user_id)
+        if entry is None or time.monotonic() - entry[0] > self.cache_ttl:
+            values = await asyncio.to_thread(self._load, user_id)
+            # Unflushed local writes win over what is on disk
+            values.update({key: value for (uid, key), value in self._pending.items() if uid == user_id})
+            entry = (time.monotonic(), values)
+            self._cache[user_id] = entry
+        return entry[1]
+
+    async def get(self, user_id, key, default=None):
+        return (await self.get_all(user_id)).get(key, default)
+
+    async def set(self, user_id, key, value):
+        values = await self.get_all(user_id)
+        values[key] = value
+        self._pending[(user_id, key)] = value
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self):
+        self._flush_task = None
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        await asyncio.to_thread(self._write, [(uid, key, value) for (uid, key), value in pending.items()])
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        await self.flush()
+        self._db.close()
+
+prefs = PrefStore()
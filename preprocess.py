@@ -0,0 +1,70 @@
+import os
+from io import BytesIO
+import workers
+import metrics
+
+# Longest side each backend gets; anything larger only costs upload time, latency and memory
+MAX_SIDE = {
+    "gemini": int(os.getenv('GEMINI_MAX_SIDE', '1536')),
+    "nukki": int(os.getenv('NUKKI_MAX_SIDE', '1024')),
+}
+PASSTHROUGH_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+ORIENTATION = 0x0112
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+def fit(image, max_side):
+    """Shrink so the longest side is at most max_side: a cheap integer reduce() first, then an exact resize."""
+    from PIL import Image
+    longest = max(image.size)
+    if longest <= max_side:
+        return image
+    factor = longest // max_side
+    if factor >= 2:
+        image = image.reduce(factor)
+    scale = max_side / max(image.size)
+    if scale < 1:
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+    return image
+
+def open_frame(data, max_side=None):
+    """Decode the first frame of an image, upright and in RGB or RGBA, optionally capped to max_side.
+
+    JPEGs are decoded at a reduced DCT scale via draft() when they are much larger than the cap.
+    """
+    from PIL import Image, ImageOps
+    image = Image.open(BytesIO(data))
+    if max_side and image.format == 'JPEG' and max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        image.draft('RGB', (round(image.width * scale), round(image.height * scale)))
+    # Animated GIF/WebP/PNG open on their first frame; everything below works on that frame only
+    image = ImageOps.exif_transpose(image)
+    image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+    if max_side:
+        image = fit(image, max_side)
+    return image
+
+def prepare(data, max_side):
+    """Return (bytes, mime type) for a model input: first frame, longest side capped, re-encoded.
+
+    Small, static, upright JPEG/PNG/WebP inputs are passed through untouched.
+    """
+    from PIL import Image
+    image = Image.open(BytesIO(data))
+    if (image.format in PASSTHROUGH_FORMATS and max(image.size) <= max_side
+            and getattr(image, 'n_frames', 1) == 1 and image.getexif().get(ORIENTATION, 1) == 1):
+        return data, PASSTHROUGH_FORMATS[image.format]
+
+    image = open_frame(data, max_side)
+    image_bytes = BytesIO()
+    if image.mode == 'RGBA':
+        image.save(image_bytes, format='PNG')
+        return image_bytes.getvalue(), "image/png"
+    image.save(image_bytes, format='JPEG', quality=92)
+    return image_bytes.getvalue(), "image/jpeg"
+
+async def preprocess(data, backend):
+    """Prepare an input image for `backend` in the worker pool, off the event loop."""
+    with metrics.timer("image_stage_seconds", stage="preprocess", backend=backend):
+        return await workers.run_cpu(prepare, data, MAX_SIDE[backend])
@@ -0,0 +1,42 @@
+import asyncio
+import inspect
+import threading
+
+# Provider SDKs are heavy to import (anthropic + openai + google-genai take seconds), so
+# clients are registered as factories and only built the first time something needs them.
+_factories = {}
+_clients = {}
+_lock = threading.Lock()
+
+def register(name, factory):
+    _factories[name] = factory
+
+def get(name):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = _factories[name]()
+    return client
+
+def loaded():
+    return list(_clients)
+
+async def warm(*names):
+    """Build clients in a thread so the SDK imports don't stall the event loop."""
+    await asyncio.gather(*(asyncio.to_thread(get, name) for name in names))
+
+async def close():
+    """Close every client that was actually created."""
+    for name, client in list(_clients.items()):
+        close = getattr(client, 'close', None)
+        if close is None:
+            continue
+        try:
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            print(f"[providers] closing {name} failed: {e}", flush=True)
+    _clients.clear()
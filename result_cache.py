@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+import metrics
+from inflight import Inflight
+
+IMAGE_CACHE_DIR = os.path.expanduser(os.getenv('IMAGE_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'image_cache')))
+IMAGE_CACHE_DISK_BYTES = int(os.getenv('IMAGE_CACHE_DISK_BYTES', str(2 * 2**30)))  # 0 keeps results in memory only
+IMAGE_CACHE_MEMORY_BYTES = int(os.getenv('IMAGE_CACHE_MEMORY_BYTES', str(256 * 2**20)))
+MAX_MEMORY_ALIASES = 10000
+
+def _key(*parts):
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode()).hexdigest()
+
+def content_key(op, data, *params):
+    """Key for an operation on these exact input bytes."""
+    return _key(op, 'sha256', hashlib.sha256(data).hexdigest(), *params)
+
+def attachment_key(op, attachment, *params):
+    """Key for an operation on a Discord attachment, known before downloading it.
+
+    Attachment ids are never reused, so id + size stands in for the bytes.
+    """
+    return _key(op, 'attachment', attachment.id, attachment.size, *params)
+
+class ResultStore:
+    """Content-addressed image results: a byte-bounded memory LRU over a byte-bounded disk LRU.
+
+    Aliases (attachment keys) point at the content key of the result, so a repeat request
+    on the same attachment is answered without downloading it again.
+    """
+
+    def __init__(self, path=IMAGE_CACHE_DIR, max_disk_bytes=IMAGE_CACHE_DISK_BYTES, max_memory_bytes=IMAGE_CACHE_MEMORY_BYTES):
+        self.path = path
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._aliases = OrderedDict()
+        self._inflight = Inflight()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db_lock = threading.Lock()
+        self._db = None
+        if max_disk_bytes:
+            os.makedirs(path, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(path, 'index.sqlite3'), check_same_thread=False, timeout=10)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, size INTEGER, accessed REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS aliases (alias TEXT PRIMARY KEY, key TEXT)")
+            self._db.commit()
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def _remember(self, key, data):
+        if len(data) > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _remember_alias(self, alias, key):
+        self._aliases[alias] = key
+        self._aliases.move_to_end(alias)
+        while len(self._aliases) > MAX_MEMORY_ALIASES:
+            self._aliases.popitem(last=False)
+
+    def _read_disk(self, key):
+        with self._db_lock:
+            row = self._db.execute("SELECT key FROM aliases WHERE alias = ?", (key,)).fetchone()
+            if row:
+                key = row[0]
+            if not self._db.execute("SELECT 1 FROM results WHERE key = ?", (key,)).fetchone():
+                return key, None
+            try:
+                with open(self._file(key), 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+                return key, None
+            self._db.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return key, data
+
+    def _write_disk(self, key, data, aliases):
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._db_lock:
+            self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)", (key, len(data), time.time()))
+            self._db.executemany("INSERT OR REPLACE INTO aliases VALUES (?, ?)", [(alias, key) for alias in aliases])
+            self._trim()
+            self._db.commit()
+
+    def _link_disk(self, aliases, key):
+        with self._db_lock:
+            self._db.executemany("INSERT OR REPLACE INTO aliases VALUES (?, ?)", [(alias, key) for alias in aliases])
+            self._db.commit()
+
+    def _trim(self):
+        # Evict least recently used results until the directory fits the byte budget
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        evicted = []
+        for key, size in self._db.execute("SELECT key, size FROM results ORDER BY accessed"):
+            if total <= self.max_disk_bytes:
+                break
+            evicted.append(key)
+            total -= size
+        for key in evicted:
+            try:
+                os.remove(self._file(key))
+            except FileNotFoundError:
+                pass
+        self._db.executemany("DELETE FROM results WHERE key = ?", [(key,) for key in evicted])
+        self._db.executemany("DELETE FROM aliases WHERE key = ?", [(key,) for key in evicted])
+
+    async def get(self, key, count_miss=True):
+        """Result bytes for a content key or alias, or None."""
+        key = self._aliases.get(key, key)
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            metrics.inc("image_cache_total", result="hit")
+            return data
+        if self._db is not None:
+            key, data = await asyncio.to_thread(self._read_disk, key)
+            if data is not None:
+                self._remember(key, data)
+                self.hits += 1
+                self.disk_hits += 1
+                metrics.inc("image_cache_total", result="disk_hit")
+                return data
+        if count_miss:
+            self.misses += 1
+            metrics.inc("image_cache_total", result="miss")
+        return None
+
+    async def put(self, key, data, aliases=()):
+        self._remember(key, data)
+        for alias in aliases:
+            self._remember_alias(alias, key)
+        if self._db is not None:
+            await asyncio.to_thread(self._write_disk, key, data, list(aliases))
+
+    async def link(self, aliases, key):
+        for alias in aliases:
+            self._remember_alias(alias, key)
+        if self._db is not None and aliases:
+            await asyncio.to_thread(self._link_disk, list(aliases), key)
+
+    async def get_or_compute(self, key, compute, aliases=()):
+        """Serve a stored result, or await compute() once for all concurrent callers and store it.
+
+        A None result (e.g. the provider returned no image) is passed through but not stored.
+        """
+        data = await self.get(key)
+        if data is not None:
+            await self.link(aliases, key)
+            return data
+        data, led = await self._inflight.run(key, compute)
+        if led and data is not None:
+            await self.put(key, data, aliases)
+        return data
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "deduped": self._inflight.deduped,
+            "entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+        }
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+result_cache = ResultStore()
@@ -0,0 +1,200 @@
+import os
+import time
+import random
+import asyncio
+from collections import defaultdict, deque
+import metrics
+
+LLM_DEADLINE = float(os.getenv('LLM_DEADLINE', '180'))  # whole request, across retries
+LLM_ATTEMPT_TIMEOUT = float(os.getenv('LLM_ATTEMPT_TIMEOUT', '120'))
+LLM_FIRST_TOKEN_TIMEOUT = float(os.getenv('LLM_FIRST_TOKEN_TIMEOUT', '20'))  # streams can only fail over before output starts
+LLM_RETRIES = int(os.getenv('LLM_RETRIES', '2'))
+LLM_BACKOFF = float(os.getenv('LLM_BACKOFF', '0.5'))
+LLM_HEDGE = os.getenv('LLM_HEDGE', '1') == '1'
+ROUTER_WINDOW = float(os.getenv('ROUTER_WINDOW', '300'))  # seconds of history kept per model
+ROUTER_MIN_SAMPLES = int(os.getenv('ROUTER_MIN_SAMPLES', '10'))
+ROUTER_ERROR_THRESHOLD = float(os.getenv('ROUTER_ERROR_THRESHOLD', '0.5'))
+
+# Timeouts, rate limits, Anthropic's 529 overloaded and other server-side failures
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+def is_retryable(e):
+    if isinstance(e, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(e, 'status_code', None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # Connection and timeout errors from the SDKs carry no status code
+    return type(e).__name__ in ('APIConnectionError', 'APITimeoutError')
+
+class ModelStats:
+    """Rolling latency and error rate for one model over the last ROUTER_WINDOW seconds."""
+
+    def __init__(self, window=ROUTER_WINDOW):
+        self.window = window
+        self._samples = deque(maxlen=1000)  # (time, latency or None, ok)
+
+    def record(self, latency, ok):
+        self._samples.append((time.monotonic(), latency, ok))
+
+    def _recent(self):
+        cutoff = time.monotonic() - self.window
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        return self._samples
+
+    def p95(self):
+        latencies = sorted(latency for _, latency, ok in self._recent() if ok and latency is not None)
+        if len(latencies) < ROUTER_MIN_SAMPLES:
+            return None
+        return latencies[int(0.95 * (len(latencies) - 1))]
+
+    def error_rate(self):
+        samples = self._recent()
+        if len(samples) < ROUTER_MIN_SAMPLES:
+            return None
+        return sum(1 for _, _, ok in samples if not ok) / len(samples)
+
+    def stats(self):
+        return {"samples": len(self._recent()), "p95": self.p95(), "error_rate": self.error_rate()}
+
+class Router:
+    """Runs LLM calls with a deadline, jittered retries, failover to a fallback model and hedging.
+
+    A call is hedged when it outlives the model's rolling p95: the same request goes to the
+    fallback and whichever finishes first wins. A model whose recent error rate is past
+    ROUTER_ERROR_THRESHOLD is skipped in favour of its fallback until its window recovers.
+    """
+
+    def __init__(self, deadline=LLM_DEADLINE, attempt_timeout=LLM_ATTEMPT_TIMEOUT, first_token_timeout=LLM_FIRST_TOKEN_TIMEOUT,
+                 retries=LLM_RETRIES, backoff=LLM_BACKOFF, hedge=LLM_HEDGE):
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.first_token_timeout = first_token_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.models = defaultdict(ModelStats)
+        # Per-model overrides of first_token_timeout, for models that send nothing until they finish thinking
+        self.first_token_timeouts = {}
+
+    def _healthy(self, model):
+        rate = self.models[model].error_rate()
+        return rate is None or rate < ROUTER_ERROR_THRESHOLD
+
+    def _decision(self, model, routed, decision):
+        metrics.inc("llm_route_total", model=model, routed=routed, decision=decision)
+
+    def _candidates(self, model, fallback):
+        # Retry the primary, then spend the last attempt on the fallback
+        if fallback and not self._healthy(model) and self._healthy(fallback):
+            self._decision(model, fallback, "skip_unhealthy")
+            return [fallback] * (self.retries + 1)
+        return [model] * self.retries + [fallback or model]
+
+    async def _sleep_backoff(self, attempt, deadline):
+        delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+        await asyncio.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+
+    async def _attempt(self, model, call, timeout_at):
+        # The timeout lives here rather than around the caller so a hung attempt is recorded as a
+        # failure; a hedge loser is cancelled from outside and deliberately left unrecorded
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout_at(timeout_at):
+                result = await call(model)
+        except Exception:
+            self.models[model].record(time.perf_counter() - start, False)
+            raise
+        self.models[model].record(time.perf_counter() - start, True)
+        return result
+
+    async def _hedged(self, requested, model, fallback, call, timeout_at):
+        primary = asyncio.create_task(self._attempt(model, call, timeout_at))
+        delay = self.models[model].p95() if self.hedge and fallback and fallback != model else None
+        if delay is None:
+            return await primary
+
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self._decision(requested, fallback, "hedge")
+                tasks.add(asyncio.create_task(self._attempt(fallback, call, timeout_at)))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._decision(requested, fallback, "hedge_win")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def run(self, model, call, fallback=None):
+        """Return `await call(routed_model)` for the first model/attempt that succeeds."""
+        deadline = time.monotonic() + self.deadline
+        candidates = self._candidates(model, fallback)
+        for attempt, current in enumerate(candidates):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"{model}: deadline of {self.deadline}s exceeded")
+            if current != model:
+                self._decision(model, current, "failover")
+            timeout_at = asyncio.get_running_loop().time() + min(remaining, self.attempt_timeout)
+            try:
+                return await self._hedged(model, current, fallback if current == model else None, call, timeout_at)
+            except Exception as e:
+                if not is_retryable(e) or attempt == len(candidates) - 1:
+                    raise
+                print(f"[router] {current} attempt {attempt + 1} failed: {e!r}", flush=True)
+                self._decision(model, current, "retry")
+                await self._sleep_backoff(attempt, deadline)
+
+    async def stream(self, model, open_stream, fallback=None):
+        """Yield from `open_stream(routed_model)`, retrying and failing over only until the first chunk arrives."""
+        deadline = time.monotonic() + self.deadline
+        candidates = self._candidates(model, fallback)
+        for attempt, current in enumerate(candidates):
+            if current != model:
+                self._decision(model, current, "failover")
+            stream = open_stream(current)
+            start = time.perf_counter()
+            try:
+                first_token_timeout = self.first_token_timeouts.get(current, self.first_token_timeout)
+                chunk = await asyncio.wait_for(anext(stream), min(first_token_timeout, max(0.0, deadline - time.monotonic())))
+            except StopAsyncIteration:
+                self.models[current].record(None, True)
+                return
+            except Exception as e:
+                await stream.aclose()
+                self.models[current].record(time.perf_counter() - start, False)
+                if not is_retryable(e) or attempt == len(candidates) - 1:
+                    raise
+                print(f"[router] {current} stream attempt {attempt + 1} failed: {e!r}", flush=True)
+                self._decision(model, current, "retry")
+                await self._sleep_backoff(attempt, deadline)
+                continue
+
+            # Output has started, so from here errors go straight to the caller
+            # Stream durations depend on output length, so they feed the error rate but not p95
+            try:
+                yield chunk
+                async for chunk in stream:
+                    yield chunk
+            except Exception:
+                self.models[current].record(None, False)
+                raise
+            finally:
+                await stream.aclose()
+            self.models[current].record(None, True)
+            return
+
+    def stats(self):
+        return {model: stats.stats() for model, stats in self.models.items()}
+
+router = Router()
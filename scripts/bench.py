@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""Offline load test for the bot (app.py).
+
+Drives simulated users through the bot's command callbacks with fake Discord objects,
+stubbed LLM/Gemini/rembg providers and a local HTTP server standing in for Modal,
+ComfyUI and the Discord CDN. Reports per-command p50/p99 latency, event-loop lag and memory.
+
+Usage: scripts/bench.py [-u users] [-r rounds] [-c llm,i2i,...] [--llm-latency s] [--image-latency s] [--result-cache]
+"""
+
+import os
+import sys
+import time
+import base64
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import tracemalloc
+from io import BytesIO
+from pathlib import Path
+from collections import defaultdict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+COMMANDS = ["llm", "llm-prefix", "json-gen", "character-gen", "i2i", "nukki", "enhance", "qwen-wan", "cathy-gen", "lora-gen"]
+
+def make_png(size):
+    """Noise PNG of roughly `size` bytes, so payloads cost what real ones do."""
+    from PIL import Image
+    side = max(16, int((size / 3) ** 0.5))
+    image = Image.frombytes('RGB', (side, side), random.randbytes(side * side * 3))
+    image_bytes = BytesIO()
+    image.save(image_bytes, format='PNG')
+    return image_bytes.getvalue()
+
+# Fake Discord objects
+
+class FakeMessage:
+    def __init__(self, content=None, files=()):
+        self.content = content
+        self.files = list(files)
+
+    async def edit(self, content=None, **kwargs):
+        self.content = content
+
+    async def add_files(self, *files):
+        self.files.extend(files)
+        return self
+
+    async def delete(self):
+        pass
+
+class FakeTyping:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class FakeChannel:
+    def typing(self):
+        return FakeTyping()
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+class FakeResponse:
+    async def defer(self, **kwargs):
+        pass
+
+    async def send_message(self, content=None, **kwargs):
+        pass
+
+class FakeFollowup:
+    def __init__(self, sent):
+        self.sent = sent
+
+    async def send(self, content=None, file=None, files=None, wait=False, **kwargs):
+        self.sent.append(time.perf_counter())
+        return FakeMessage(content, [file] if file else files or ())
+
+class FakeInteraction:
+    def __init__(self, user_id, guild_id):
+        self.user = FakeUser(user_id)
+        self.guild_id = guild_id
+        self.channel = FakeChannel()
+        self.response = FakeResponse()
+        self.sent = []
+        self.followup = FakeFollowup(self.sent)
+        self.extras = {}
+
+    async def edit_original_response(self, content=None, **kwargs):
+        pass
+
+    async def delete_original_response(self):
+        pass
+
+class FakeAttachment:
+    def __init__(self, url, size):
+        self.id = random.getrandbits(63)
+        self.url = url
+        self.size = size
+
+class FakeContextMessage:
+    def __init__(self, attachments):
+        self.reference = None
+        self.attachments = attachments
+
+class FakeContext:
+    def __init__(self, user_id, guild_id, attachments=()):
+        self.author = FakeUser(user_id)
+        self.guild = FakeGuild(guild_id)
+        self.prefix = '!'
+        self.channel = FakeChannel()
+        self.message = FakeContextMessage(list(attachments))
+        self.sent = []
+
+    def typing(self):
+        return FakeTyping()
+
+    async def reply(self, content=None, file=None, **kwargs):
+        self.sent.append(time.perf_counter())
+        return FakeMessage(content, [file] if file else ())
+
+# Fake providers
+
+class FakeProviders:
+    def __init__(self, args, image):
+        self.args = args
+        self.image = image
+
+    async def allm(self, prompt, system=None, schema=None, model=None, cache=False):
+        await asyncio.sleep(self.args.llm_latency)
+        if schema:
+            return {"sheet": "x" * self.args.text_size, "portrait": "portrait description"}
+        return "x" * self.args.text_size
+
+    async def achat_response(self, chat_messages, system=None, schema=None, model=None, cache=False):
+        return await self.allm(None, schema=schema)
+
+    async def astream_llm(self, prompt, system=None, model=None, cache=False):
+        chunks = 20
+        for _ in range(chunks):
+            await asyncio.sleep(self.args.llm_latency / chunks)
+            yield "x" * (self.args.text_size // chunks)
+
+    def astream_chat_response(self, chat_messages, system=None, model=None, cache=False):
+        return self.astream_llm(None)
+
+    async def gemini_image(self, contents):
+        await asyncio.sleep(self.args.image_latency)
+        return self.image
+
+    async def nukki_remove(self, image_data):
+        await asyncio.sleep(self.args.nukki_latency)
+        return self.image
+
+async def start_fake_server(args, image):
+    """Local aiohttp app mimicking the Modal endpoint, ComfyUI's HTTP API and the Discord CDN."""
+    from aiohttp import web
+
+    encoded = base64.b64encode(image).decode()
+    history = {}
+
+    async def modal(request):
+        # Streams the batch an image at a time, as a GPU finishing images one after another would
+        body = await request.json()
+        count = body["batch_size"]
+        resp = web.StreamResponse(headers={"Content-Type": "application/json"})
+        await resp.prepare(request)
+        await resp.write(b'{"images": [')
+        for i in range(count):
+            await asyncio.sleep(args.image_latency / count)
+            await resp.write((', ' if i else '').encode() + b'"' + encoded.encode() + b'"')
+        await resp.write(b']}')
+        await resp.write_eof()
+        return resp
+
+    async def comfy_prompt(request):
+        body = await request.json()
+        prompt_id = str(len(history))
+        history[prompt_id] = (time.monotonic() + args.image_latency, body["prompt"]["129"]["inputs"]["batch_size"])
+        return web.json_response({"prompt_id": prompt_id})
+
+    async def comfy_history(request):
+        prompt_id = request.match_info["prompt_id"]
+        ready_at, count = history[prompt_id]
+        if time.monotonic() < ready_at:
+            return web.json_response({})
+        images = [{"filename": f"{i}.png", "subfolder": ""} for i in range(count)]
+        return web.json_response({prompt_id: {"status": {"completed": True}, "outputs": {"157": {"images": images}}}})
+
+    async def comfy_view(request):
+        return web.Response(body=image, content_type='image/png')
+
+    async def attachment(request):
+        return web.Response(body=image, content_type='image/png')
+
+    app = web.Application()
+    app.router.add_post('/modal', modal)
+    app.router.add_post('/prompt', comfy_prompt)
+    app.router.add_get('/history/{prompt_id}', comfy_history)
+    app.router.add_get('/view', comfy_view)
+    app.router.add_get('/attachment.png', attachment)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+def fake_workflow(name):
+    return {
+        "434": {"inputs": {}},
+        "129": {"inputs": {}},
+        "135": {"inputs": {"lora_2": {}}},
+        "136": {"inputs": {}},
+        "160": {"inputs": {}},
+    }
+
+async def monitor_lag(samples, interval=0.01):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+async def run_command(bot_module, name, user_id, base_url, args):
+    guild_id = user_id % 4
+    prompt = f"bench prompt {user_id}"
+    tree = bot_module.bot.tree
+
+    if name in ("llm-prefix", "i2i", "nukki", "enhance"):
+        ctx = FakeContext(user_id, guild_id, [FakeAttachment(f"{base_url}/attachment.png", args.image_size)])
+        command = bot_module.bot.get_command(name.replace("-prefix", ""))
+        kwargs = {} if name == "nukki" else {"prompt": prompt}
+        await command.callback(ctx, **kwargs)
+        return ctx.sent
+
+    interaction = FakeInteraction(user_id, guild_id)
+    if name == "json-gen":
+        await tree.get_command(name).callback(interaction, prompt=prompt, properties="a, b, c")
+    elif name == "lora-gen":
+        await tree.get_command(f"{bot_module.LORAS[0]}-gen").callback(interaction, prompt=prompt, number=2)
+    elif name == "cathy-gen":
+        await tree.get_command(name).callback(interaction, prompt=prompt, number=4)
+    else:
+        await tree.get_command(name).callback(interaction, prompt=prompt)
+    return interaction.sent
+
+async def main(args):
+    # Placeholder credentials so the SDK clients can be constructed; nothing is sent upstream
+    for key in ('ANTHROPIC_API_KEY', 'OPENAI_API_KEY', 'GEMINI_API_KEY', 'DISCORD_BOT_TOKEN'):
+        os.environ.setdefault(key, 'bench')
+    tmp = tempfile.mkdtemp(prefix='bench-')
+    os.environ['PREFS_DB'] = os.path.join(tmp, 'prefs.sqlite3')
+    os.environ['COMMAND_HASH_FILE'] = os.path.join(tmp, 'command_tree_hash')
+    os.environ['IMAGE_CACHE_DIR'] = os.path.join(tmp, 'image_cache')
+    if not args.result_cache:
+        # Every simulated upload has the same bytes, so the result cache would answer all but the first
+        os.environ['IMAGE_CACHE_DISK_BYTES'] = '0'
+        os.environ['IMAGE_CACHE_MEMORY_BYTES'] = '0'
+    os.environ.setdefault('JOB_USER_QUOTA', str(args.rounds + 1))
+    os.environ.setdefault('JOB_GUILD_QUOTA', str(args.users * len(args.commands)))
+
+    tracemalloc.start()
+    import app as bot_module
+    import comfyui
+    import enhance
+
+    image = make_png(args.image_size)
+    providers = FakeProviders(args, image)
+    runner, base_url = await start_fake_server(args, image)
+
+    bot_module.allm = providers.allm
+    bot_module.astream_llm = providers.astream_llm
+    bot_module.astream_chat_response = providers.astream_chat_response
+    bot_module.gemini_image = providers.gemini_image
+    bot_module.nukki_service.remove = providers.nukki_remove
+    bot_module.MODAL_API_URL = f"{base_url}/modal"
+    enhance.achat_response = providers.achat_response
+    comfyui.COMFYUI_URL = base_url
+    comfyui.POLL_INTERVAL = min(comfyui.POLL_INTERVAL, args.image_latency / 4)
+    comfyui.load_workflow = fake_workflow
+
+    lag = []
+    lag_task = asyncio.create_task(monitor_lag(lag))
+    latencies = defaultdict(list)
+    first_reply = defaultdict(list)
+    errors = defaultdict(int)
+
+    async def user(user_id, name):
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            try:
+                sent = await run_command(bot_module, name, user_id, base_url, args)
+            except Exception as e:
+                errors[name] += 1
+                if args.verbose:
+                    print(f"[bench] {name}: {e!r}", flush=True)
+                continue
+            latencies[name].append(time.perf_counter() - start)
+            if sent:
+                first_reply[name].append(sent[0] - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(i * len(args.commands) + j, name)
+                           for i in range(args.users) for j, name in enumerate(args.commands)))
+    wall = time.perf_counter() - started
+
+    lag_task.cancel()
+    _, peak = tracemalloc.get_traced_memory()
+    await runner.cleanup()
+    await bot_module.prefs.close()
+    await bot_module.close_session()
+    bot_module.workers.shutdown()
+
+    print(f"{args.users} users x {args.rounds} rounds in {wall:.2f}s")
+    print(f"{'command':<16}{'n':>5}{'err':>5}{'p50':>9}{'p99':>9}{'first p50':>11}")
+    for name in args.commands:
+        values = latencies[name]
+        print(f"{name:<16}{len(values):>5}{errors[name]:>5}{percentile(values, 50):>9.3f}{percentile(values, 99):>9.3f}"
+              f"{percentile(first_reply[name], 50):>11.3f}")
+    print(f"event loop lag: p50 {percentile(lag, 50) * 1000:.1f}ms  p99 {percentile(lag, 99) * 1000:.1f}ms  max {max(lag, default=0) * 1000:.1f}ms")
+    print(f"memory: python peak {peak / 2**20:.1f} MiB  max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline load test for bot.py with fake Discord and providers")
+    parser.add_argument('-u', '--users', type=int, default=10, help="concurrent simulated users per command")
+    parser.add_argument('-r', '--rounds', type=int, default=3, help="commands each user runs back to back")
+    parser.add_argument('-c', '--commands', default=",".join(COMMANDS), help=f"comma-separated subset of {','.join(COMMANDS)}")
+    parser.add_argument('--llm-latency', type=float, default=1.0)
+    parser.add_argument('--image-latency', type=float, default=2.0)
+    parser.add_argument('--nukki-latency', type=float, default=0.3)
+    parser.add_argument('--text-size', type=int, default=3000, help="characters per LLM reply")
+    parser.add_argument('--image-size', type=int, default=1_500_000, help="approximate bytes per image")
+    parser.add_argument('--result-cache', action='store_true', help="leave the i2i/nukki result cache on")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+    args.commands = [c for c in args.commands.split(',') if c]
+    unknown = set(args.commands) - set(COMMANDS)
+    if unknown:
+        parser.error(f"unknown commands: {', '.join(sorted(unknown))}")
+    asyncio.run(main(args))
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import signal
+import argparse
+import subprocess
+from pathlib import Path
+
+BOT_PATH = Path(__file__).resolve().parent.parent / 'bot.py'
+
+parser = argparse.ArgumentParser(description="Run bot.py as several shard processes on this machine")
+parser.add_argument('-s', '--shards', type=int, required=True, help="total shard count")
+parser.add_argument('-p', '--processes', type=int, default=max(1, (os.cpu_count() or 1) // 4),
+                    help="number of bot processes [default: CPU cores / 4]")
+args = parser.parse_args()
+
+processes = min(args.processes, args.shards)
+cores = os.cpu_count() or 1
+
+# Each process runs its own rembg and CPU pools and its own job scheduler, so split machine-wide
+# budgets between them (the values in the environment are treated as totals for the machine)
+def share(name, total):
+    total = int(os.getenv(name, str(total)))
+    if total < processes:
+        print(f"warning: {name}={total} is below the process count, each process still gets 1", flush=True)
+    return str(max(1, total // processes))
+
+nukki_workers = share('NUKKI_WORKERS', max(1, cores // 2))
+cpu_workers = share('WORKER_PROCESSES', max(1, cores // 2))
+# Defaults as in jobs.py; queue lengths and per-user/guild quotas stay per process
+job_limits = {name: share(name, total) for name, total in (
+    ('JOB_LIMIT_GEMINI', 4), ('JOB_LIMIT_COMFYUI', 2), ('JOB_LIMIT_MODAL', 16), ('JOB_LIMIT_NUKKI', cores))}
+nukki_threads = str(max(1, cores // (processes * int(nukki_workers))))
+procs = []
+for i in range(processes):
+    shard_ids = ",".join(str(s) for s in range(i, args.shards, processes))
+    env = dict(os.environ, SHARD_IDS=shard_ids, SHARD_COUNT=str(args.shards),
+               NUKKI_WORKERS=nukki_workers, WORKER_PROCESSES=cpu_workers, **job_limits)
+    env.setdefault('NUKKI_THREADS', nukki_threads)
+    # Only the process owning shard 0 registers slash commands
+    env.setdefault('SYNC_COMMANDS', '1' if i == 0 else '0')
+    print(f"Starting process {i} with shards {shard_ids} ({nukki_workers} rembg + {cpu_workers} CPU workers)", flush=True)
+    procs.append(subprocess.Popen([sys.executable, str(BOT_PATH)], env=env))
+
+def stop(signum, frame):
+    for proc in procs:
+        proc.send_signal(signal.SIGINT)
+
+signal.signal(signal.SIGINT, stop)
+signal.signal(signal.SIGTERM, stop)
+
+sys.exit(max(proc.wait() for proc in procs))
@@ -1,33 +1,46 @@
 #!/usr/bin/env python3
 
 import sys
+import asyncio
 from pathlib import Path
-from rembg import remove
-from PIL import Image
 
-if len(sys.argv) != 2:
-    print("Usage: nukki.py <input_image>")
-    print("Output will be saved as <input_image>_nukki.png")
-    sys.exit(1)
-
-input_path = Path(sys.argv[1])
-
-if not input_path.exists():
-    print(f"Error: {input_path} does not exist")
-    sys.exit(1)
-
-# Generate output filename
-output_path = input_path.parent / f"{input_path.stem}_nukki.png"
-
-print(f"Removing background from {input_path}...")
-
-# Load image
-input_img = Image.open(input_path)
-
-# Remove background
-output_img = remove(input_img)
-
-# Save result
-output_img.save(output_path)
-
-print(f"Saved to {output_path}")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from segmentation import NukkiService, NUKKI_WORKERS
+
+IMAGE_SUFFIXES = {'.png', '.jpg', '.jpeg', '.webp', '.bmp'}
+
+def collect_inputs(args):
+    input_paths = []
+    for arg in args:
+        path = Path(arg)
+        if not path.exists():
+            print(f"Error: {path} does not exist")
+            sys.exit(1)
+        if path.is_dir():
+            input_paths.extend(sorted(p for p in path.iterdir()
+                                      if p.suffix.lower() in IMAGE_SUFFIXES and not p.stem.endswith('_nukki')))
+        else:
+            input_paths.append(path)
+    return input_paths
+
+async def remove_one(service, input_path):
+    # Generate output filename
+    output_path = input_path.parent / f"{input_path.stem}_nukki.png"
+    print(f"Removing background from {input_path}...")
+    output_path.write_bytes(await service.remove(input_path.read_bytes()))
+    print(f"Saved to {output_path}")
+
+async def main(input_paths):
+    service = NukkiService(workers=max(1, min(len(input_paths), NUKKI_WORKERS)))
+    await service.start()
+    try:
+        await asyncio.gather(*(remove_one(service, p) for p in input_paths))
+    finally:
+        await service.stop()
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: nukki.py <input_image|directory> [...]")
+        print("Output will be saved as <input_image>_nukki.png")
+        sys.exit(1)
+    asyncio.run(main(collect_inputs(sys.argv[1:])))
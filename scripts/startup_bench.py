@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Cold-start benchmark for the bot (app.py).
+
+Starts fresh interpreters and times what happens before the gateway connects: importing
+app.py and running setup_hook (command tree sync is stubbed, warm-up is skipped). Also
+reports what the first use of each lazily created provider client costs. Exits non-zero
+when the median startup exceeds --budget, so it can guard against heavy imports creeping back.
+
+Usage: scripts/startup_bench.py [-n runs] [--budget seconds]
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def child():
+    # Placeholder credentials so the SDK clients can be constructed; nothing is sent upstream
+    for key in ('ANTHROPIC_API_KEY', 'OPENAI_API_KEY', 'GEMINI_API_KEY', 'DISCORD_BOT_TOKEN'):
+        os.environ.setdefault(key, 'bench')
+    tmp = tempfile.mkdtemp(prefix='startup-bench-')
+    os.environ['PREFS_DB'] = os.path.join(tmp, 'prefs.sqlite3')
+    os.environ['COMMAND_HASH_FILE'] = os.path.join(tmp, 'command_tree_hash')
+    sys.path.insert(0, str(ROOT))
+
+    start = time.perf_counter()
+    import app as bot_module
+    imported = time.perf_counter()
+
+    async def no_op():
+        pass
+
+    async def run():
+        bot_module.bot.tree.sync = no_op
+        bot_module.warm_up = no_op
+        await bot_module.setup_hook()
+        ready = time.perf_counter()
+        first_sync = ready - imported
+
+        # A restart with an unchanged command tree skips the sync entirely
+        t = time.perf_counter()
+        synced = await bot_module.sync_commands()
+        resync = time.perf_counter() - t
+
+        lazy = {}
+        for name in ('async_anthropic', 'async_openai', 'gemini'):
+            t = time.perf_counter()
+            bot_module.providers.get(name)
+            lazy[name] = time.perf_counter() - t
+        await bot_module.providers.close()
+        await bot_module.metrics.stop()
+        return {"import": imported - start, "setup_hook": first_sync, "startup": ready - start,
+                "resync": resync, "resynced": synced, "lazy": lazy}
+
+    print(json.dumps(asyncio.run(run())), flush=True)
+
+def main(args):
+    runs = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, __file__, '--child'], cwd=ROOT, capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        result["process"] = time.perf_counter() - start
+        runs.append(result)
+
+    def row(label, values):
+        print(f"{label:<28}{statistics.median(values) * 1000:>9.1f}{max(values) * 1000:>9.1f}")
+
+    print(f"{args.runs} cold starts")
+    print(f"{'stage (ms)':<28}{'median':>9}{'max':>9}")
+    row("import bot", [r["import"] for r in runs])
+    row("setup_hook", [r["setup_hook"] for r in runs])
+    row("startup (before gateway)", [r["startup"] for r in runs])
+    row("interpreter total", [r["process"] for r in runs])
+    row("unchanged tree re-sync", [r["resync"] for r in runs])
+    for name in runs[0]["lazy"]:
+        row(f"first use: {name}", [r["lazy"][name] for r in runs])
+    if any(r["resynced"] for r in runs):
+        print("warning: unchanged command tree was synced again", flush=True)
+
+    median = statistics.median(r["startup"] for r in runs)
+    if median > args.budget:
+        print(f"startup median {median:.3f}s exceeds budget {args.budget:.3f}s", flush=True)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for the bot")
+    parser.add_argument('-n', '--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=1.0, help="max median seconds before the gateway connects")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+    else:
+        main(args)
@@ -0,0 +1,147 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+import metrics
+from preprocess import open_frame, fit, MAX_SIDE
+
+NUKKI_MODEL = os.getenv('NUKKI_MODEL', 'u2net')
+NUKKI_WORKERS = int(os.getenv('NUKKI_WORKERS', str(max(1, (os.cpu_count() or 1) // 2))))
+# onnxruntime uses every core per session by default; split the cores between workers instead
+NUKKI_THREADS = int(os.getenv('NUKKI_THREADS', str(max(1, (os.cpu_count() or 1) // NUKKI_WORKERS))))
+NUKKI_BATCH_SIZE = int(os.getenv('NUKKI_BATCH_SIZE', '4'))
+NUKKI_BATCH_WINDOW = float(os.getenv('NUKKI_BATCH_WINDOW', '0.05'))
+
+# rembg session for the current process (one per pool worker)
+_session = None
+
+def _get_session(model_name=NUKKI_MODEL):
+    global _session
+    if _session is None:
+        from rembg import new_session
+        _session = new_session(model_name)
+    return _session
+
+def _init_worker(model_name, threads):
+    # rembg sizes the session's intra/inter-op thread pools from OMP_NUM_THREADS
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    _get_session(model_name)
+
+def _warm():
+    return os.getpid()
+
+def cutout(data, session, max_side=MAX_SIDE["nukki"]):
+    """Segment a downscaled copy and apply the upsampled mask to the full-size first frame."""
+    from rembg import remove
+    from PIL import Image
+
+    original = open_frame(data).convert('RGBA')
+    mask = remove(fit(original, max_side), session=session, only_mask=True)
+    if mask.size != original.size:
+        mask = mask.resize(original.size, Image.BILINEAR)
+    return Image.composite(original, Image.new('RGBA', original.size, 0), mask)
+
+def remove_batch(images):
+    """Remove backgrounds from a list of encoded images, returning PNG bytes for each."""
+    session = _get_session()
+    results = []
+    for data in images:
+        output_image = cutout(data, session)
+        image_bytes = BytesIO()
+        output_image.save(image_bytes, format='PNG')
+        results.append(image_bytes.getvalue())
+    return results
+
+class NukkiService:
+    """Keeps warm rembg sessions in a process pool and feeds them batches from an async queue."""
+
+    def __init__(self, workers=NUKKI_WORKERS, batch_size=NUKKI_BATCH_SIZE, batch_window=NUKKI_BATCH_WINDOW, model_name=NUKKI_MODEL,
+                 threads=NUKKI_THREADS):
+        self.workers = workers
+        self.threads = threads
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.model_name = model_name
+        self._queue = None
+        self._pool = None
+        self._slots = None
+        self._dispatcher = None
+        self._start_lock = asyncio.Lock()
+
+    async def start(self):
+        async with self._start_lock:
+            if self._dispatcher is not None:
+                return
+            loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.workers)
+            self._pool = self._new_pool()
+            # Spawn every worker now so the model load happens at startup, not on the first request
+            await asyncio.gather(*(loop.run_in_executor(self._pool, _warm) for _ in range(self.workers)))
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.model_name, self.threads)
+        )
+
+    async def stop(self):
+        if self._dispatcher is None:
+            return
+        self._dispatcher.cancel()
+        self._dispatcher = None
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+    async def remove(self, image_data):
+        """Queue one encoded image and return the background-removed PNG bytes."""
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image_data, future))
+        return await future
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free worker first so requests pile up into larger batches under load
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            asyncio.create_task(self._run(batch))
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        metrics.observe("nukki_batch_size", len(batch))
+        pool = self._pool
+        try:
+            with metrics.timer("image_stage_seconds", stage="nukki"):
+                results = await loop.run_in_executor(pool, remove_batch, [data for data, _ in batch])
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool) and self._pool is pool:
+                # A worker died (e.g. OOM on a huge image); replace the pool so only this batch fails
+                print(f"[nukki] Worker pool broke, restarting it: {e}", flush=True)
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = self._new_pool()
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+nukki_service = NukkiService()
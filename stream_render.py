@@ -0,0 +1,45 @@
+import os
+import asyncio
+
+MESSAGE_LIMIT = 2000
+# Discord allows roughly 5 edits per 5 seconds per channel; stay under it
+EDIT_INTERVAL = float(os.getenv('STREAM_EDIT_INTERVAL', '1.0'))
+
+async def render_stream(chunks, send, prefix=""):
+    """Show an async text stream in Discord by editing messages as it arrives.
+
+    `send(content)` must post a new message and return it. The current message is edited
+    at most every EDIT_INTERVAL seconds and a new one is started at the 2000-character limit.
+    Returns the full text.
+    """
+    loop = asyncio.get_running_loop()
+    text = prefix
+    message = None
+    start = 0  # offset of the current message within text
+    shown = ""
+    last_edit = 0.0
+
+    async def flush():
+        nonlocal message, start, shown, last_edit
+        while True:
+            content = text[start:start + MESSAGE_LIMIT]
+            if content.strip() and content != shown:
+                if message is None:
+                    message = await send(content)
+                else:
+                    await message.edit(content=content)
+                shown = content
+            if len(text) - start <= MESSAGE_LIMIT:
+                break
+            # Current message is full, roll over to a new one
+            start += MESSAGE_LIMIT
+            message = None
+            shown = ""
+        last_edit = loop.time()
+
+    async for chunk in chunks:
+        text += chunk
+        if loop.time() - last_edit >= EDIT_INTERVAL:
+            await flush()
+    await flush()
+    return text
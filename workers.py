@@ -0,0 +1,35 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+# CPU-bound work (image decode/encode) runs here so it never competes with gateway heartbeats
+WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', str(max(1, (os.cpu_count() or 2) // 2))))
+
+_pool = None
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=WORKER_PROCESSES, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+async def run_cpu(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_pool(), fn, *args)
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def transcode(data, fmt):
+    from PIL import Image
+    image = Image.open(BytesIO(data))
+    image_bytes = BytesIO()
+    if fmt == "webp":
+        image.save(image_bytes, format='WEBP', lossless=True, method=4)
+    else:
+        image.save(image_bytes, format='PNG', optimize=True)
+    return image_bytes.getvalue()